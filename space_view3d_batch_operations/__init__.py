@@ -183,6 +183,10 @@ class ThisAddonPreferences:
     default_select_state = True | prop("Default row selection state", name="Rows selected by default")
     use_rename_popup = True | prop("Use a separate dialog for batch renaming", name="Use popup dialog for renaming")
     include_duplis = False | prop("Process dupli instances (Groups Pro/nested groups support)", name="Process dupli instances")
+    show_performance_info = False | prop("Show refresh/draw timings of the Batch panels", name="Show performance info")
+    use_fingerprints_file = False | prop("Store material fingerprints in a file next to the .blend (speeds up repeated merges)", name="Fingerprint cache file")
+    merge_workers = 0 | prop("Worker processes for comparing materials in Merge identical (0: compare in Blender's process)", name="Merge workers", min=0, max=64)
+    repeat_info_reports = False | prop("Also offer non-operator actions (e.g. property edits) from the Info log in Repeat actions (temporarily switches an area to Info and uses the clipboard)", name="Repeat Info reports")
     
     show_operations_as_list = False | prop("Show all in one line or each in a separate row")
     
@@ -270,6 +274,10 @@ class ThisAddonPreferences:
             layout.prop(self, "default_select_state")
             layout.prop(self, "use_rename_popup")
             layout.prop(self, "include_duplis")
+            layout.prop(self, "show_performance_info")
+            layout.prop(self, "use_fingerprints_file")
+            layout.prop(self, "merge_workers")
+            layout.prop(self, "repeat_info_reports")
         
         with layout.row()(alignment='LEFT'):
             with layout.column():
@@ -22,6 +22,8 @@ import bpy
 import time
 import json
 
+from collections import deque
+
 from mathutils import Vector
 
 try:
@@ -36,7 +38,7 @@ from {0}dairin0d.utils_userinput import KeyMapUtils
 from {0}dairin0d.utils_ui import NestedLayout, tag_redraw, find_ui_area, ui_context_under_coord
 from {0}dairin0d.bpy_inspect import prop, BlRna, BlEnums, BpyOp
 from {0}dairin0d.utils_accumulation import Aggregator, VectorAggregator, PatternRenamer
-from {0}dairin0d.utils_blender import ChangeMonitor, Selection, SelectionSnapshot, ToggleObjectMode, IndividuallyActiveSelected, BlUtil
+from {0}dairin0d.utils_blender import ChangeMonitor, OperatorHistory, Selection, SelectionSnapshot, ToggleObjectMode, IndividuallyActiveSelected, IndividualContextOverrides, ObjectsContextOverride, BlUtil
 from {0}dairin0d.utils_addon import AddonManager, UIMonitor
 """.format(dairin0d_location))
 
@@ -44,7 +46,60 @@ addon = AddonManager()
 
 idnames_separator = "\t"
 
-change_monitor = ChangeMonitor(update=False) # used in batch_repeat_actions operator
+operator_history = OperatorHistory() # used in batch_repeat_actions operator
+change_monitor = ChangeMonitor(update=False) # used in batch_repeat_actions operator (Info reports)
+
+@addon.scene_update_post
+def scene_update_post(scene):
+    operator_history.update()
+
+class RefreshTimings:
+    """Rolling timing statistics of category refresh/draw phases"""
+    phases = ("workset", "collect_info", "selection", "fill", "draw")
+    phase_names = {"workset":"Workset", "collect_info":"Collect info",
+        "selection":"Selection", "fill":"Row fill", "draw":"Draw"}
+    history_size = 64
+    
+    def __init__(self):
+        self.samples = {phase:deque(maxlen=self.history_size) for phase in self.phases}
+        self.last = {phase:0.0 for phase in self.phases}
+        self.rows = 0
+        self.objects = 0
+        self.interval = 0.0
+        self.refresh_time = None
+    
+    def add(self, phase, duration):
+        self.last[phase] = duration
+        self.samples[phase].append(duration)
+    
+    def refreshed(self, rows, objects):
+        curr_time = time.clock()
+        if self.refresh_time is not None: self.interval = curr_time - self.refresh_time
+        self.refresh_time = curr_time
+        self.rows = rows
+        self.objects = objects
+    
+    def percentile(self, phase, p):
+        samples = sorted(self.samples[phase])
+        if not samples: return 0.0
+        return samples[min(int(round(p * (len(samples) - 1))), len(samples) - 1)]
+    
+    @property
+    def total(self):
+        return sum(self.last.values())
+    
+    def format_phase(self, phase):
+        return "{}: {:.1f} ms (p50 {:.1f}, p95 {:.1f})".format(self.phase_names[phase],
+            self.last[phase] * 1000.0, self.percentile(phase, 0.5) * 1000.0, self.percentile(phase, 0.95) * 1000.0)
+    
+    def format_counts(self):
+        return "Rows: {}, objects: {}, interval: {:.2f} s".format(self.rows, self.objects, self.interval)
+    
+    def draw(self, layout):
+        with layout.column(True):
+            for phase in self.phases:
+                layout.label(self.format_phase(phase))
+            layout.label(self.format_counts())
 
 def LeftRightPanel(cls=None, **kwargs):
     def AddPanels(cls, kwargs):
@@ -123,7 +178,86 @@ def apply_shapekeys(obj):
         # This seems to be the only way to remove a shape key
         bpy.ops.object.shape_key_remove(all=False)
 
-def apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA'):
+def can_apply_modifier_stack_data(obj, idnames, apply_as, make_single_user, remove_disabled):
+    # The data-level path is only equivalent to applying the modifiers one by one
+    # when the whole stack is applied and the disabled modifiers are removed anyway
+    # (to_mesh() silently skips them, while modifier_apply() would keep them)
+    if (apply_as != 'DATA') or (not remove_disabled): return False
+    if obj.type != 'MESH': return False
+    if obj.data.shape_keys: return False # modifier_apply() reports an error for these
+    if (obj.data.users > 1) and (not make_single_user): return False
+    if idnames is None: return True
+    return all((md.type in idnames) for md in obj.modifiers)
+
+def modifier_stack_mesh(obj, scene):
+    mesh = obj.to_mesh(scene, True, 'PREVIEW')
+    # to_mesh() fills the materials from the object's slots, which would move
+    # the object-linked materials into the data (and to other users of the mesh)
+    materials = mesh.materials
+    for i, mat in enumerate(obj.data.materials):
+        if i >= len(materials): break
+        materials[i] = mat
+    return mesh
+
+def apply_modifier_stack_data(obj, scene, mesh=None):
+    old_mesh = obj.data
+    obj.data = mesh or modifier_stack_mesh(obj, scene)
+    for md in tuple(obj.modifiers):
+        obj.modifiers.remove(md)
+    return old_mesh
+
+# Modifiers whose result depends on per-object state (bindings, caches, simulations)
+object_dependent_modifiers = {'MESH_DEFORM', 'SURFACE_DEFORM', 'LAPLACIANDEFORM', 'MESH_CACHE',
+    'MESH_SEQUENCE_CACHE', 'CLOTH', 'SOFT_BODY', 'COLLISION', 'PARTICLE_SYSTEM', 'PARTICLE_INSTANCE',
+    'EXPLODE', 'DYNAMIC_PAINT', 'FLUID_SIMULATION', 'SMOKE', 'OCEAN'}
+
+# Texture mapping properties; in 'GLOBAL' mode the result depends on the object's matrix_world
+global_mapping_properties = {'DISPLACE':"texture_coords", 'WAVE':"texture_coords", 'WARP':"texture_coords",
+    'VERTEX_WEIGHT_EDIT':"mask_tex_mapping", 'VERTEX_WEIGHT_MIX':"mask_tex_mapping",
+    'VERTEX_WEIGHT_PROXIMITY':"mask_tex_mapping"}
+
+def modifier_depends_on_object(md, data):
+    if md.type in object_dependent_modifiers: return True
+    mapping_name = global_mapping_properties.get(md.type)
+    if mapping_name and (data.get(mapping_name) == 'GLOBAL'): return True
+    return any(isinstance(value, bpy.types.Object) for value in data.values())
+
+def hashable_value(value):
+    if isinstance(value, (str, bytes, bpy.types.bpy_struct)): return value
+    if isinstance(value, dict): return tuple(sorted((k, hashable_value(v)) for k, v in value.items()))
+    if isinstance(value, (set, frozenset)): return frozenset(value)
+    if hasattr(value, "__len__"): return tuple(hashable_value(v) for v in value) # lists, vectors, matrices
+    return value
+
+def modifier_params(md, ignore=("name", "show_expanded")):
+    data = BlRna.serialize(md)
+    for name in ignore:
+        data.pop(name, None)
+    return data
+
+def modifier_stack_key(obj):
+    """Hashable description of the object's modifier stack (types and parameters in order)"""
+    key = []
+    depends_on_object = False
+    for md in obj.modifiers:
+        data = modifier_params(md)
+        if not depends_on_object:
+            depends_on_object = modifier_depends_on_object(md, data)
+        key.append((md.type, hashable_value(data)))
+    if depends_on_object:
+        # the result depends on the object's transform or per-object data
+        key.append(obj)
+    elif obj.vertex_groups:
+        # vertex group names are stored in the object, not in the mesh
+        key.append(tuple(vg.name for vg in obj.vertex_groups))
+    return tuple(key)
+
+def iter_apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA', failures=None, objects_to_delete=None):
+    """
+    Applies modifiers object by object, yielding after each processed object
+    (so that the caller can stop at any object boundary). Failures are
+    collected as (object name, modifier name, message) tuples.
+    """
     active_obj = scene.objects.active
     
     covert_to_mesh = ('CONVERT_TO_MESH' in options)
@@ -132,16 +266,36 @@ def apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA'):
     delete_operands = ('DELETE_OPERANDS' in options)
     apply_shape_keys = ('APPLY_SHAPE_KEYS' in options)
     visible_only = ('VISIBLE_ONLY' in options)
+    keep_instances = ('KEEP_INSTANCES' in options)
     
-    objects_to_delete = set()
+    if failures is None: failures = []
+    if objects_to_delete is None: objects_to_delete = set()
+    replaced_meshes = {}
+    instanced_meshes = {}
     
-    for obj in objects:
-        scene.objects.active = obj
-        
+    def add_operands_to_delete(obj):
+        for md in obj.modifiers:
+            if (md.type == 'BOOLEAN') and md.show_viewport and md.object:
+                objects_to_delete.add(md.object)
+    
+    def apply_obj(obj):
         # Users will probably want shape keys to be applied regardless of whether there are modifiers
         if apply_shape_keys: apply_shapekeys(obj) # also makes single-user
         
-        if not obj.modifiers: continue
+        if not obj.modifiers: return
+        
+        if keep_instances and (obj.type == 'MESH'):
+            if can_apply_modifier_stack_data(obj, idnames, apply_as, True, remove_disabled):
+                # Evaluate each unique (mesh, stack) combination only once and share the result
+                key = (obj.data, modifier_stack_key(obj))
+                mesh = instanced_meshes.get(key)
+                if mesh is None:
+                    mesh = modifier_stack_mesh(obj, scene)
+                    instanced_meshes[key] = mesh
+                if delete_operands: add_operands_to_delete(obj)
+                old_mesh = apply_modifier_stack_data(obj, scene, mesh)
+                replaced_meshes[old_mesh] = mesh
+                return
         
         if (obj.type != 'MESH') and covert_to_mesh:
             # "Error: Cannot apply constructive modifiers on curve"
@@ -151,6 +305,13 @@ def apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA'):
             # "Error: Modifiers cannot be applied to multi-user data"
             if obj.data.users > 1: obj.data = obj.data.copy() # don't affect other objects
         
+        if can_apply_modifier_stack_data(obj, idnames, apply_as, make_single_user, remove_disabled):
+            # Evaluate the final mesh once instead of calling the operator for each modifier
+            if delete_operands: add_operands_to_delete(obj)
+            old_mesh = apply_modifier_stack_data(obj, scene)
+            replaced_meshes[old_mesh] = obj.data
+            return
+        
         for md in tuple(obj.modifiers):
             if (idnames is not None) and (md.type not in idnames): continue
             
@@ -172,6 +333,7 @@ def apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA'):
                     exc_msg = exc.args[0].lower()
                     # "Error: Modifier is disabled, skipping apply"
                     is_disabled = ("disab" in exc_msg) or ("skip" in exc_msg)
+                    if not is_disabled: failures.append((obj.name, md.name, exc.args[0].strip()))
             
             if is_disabled and remove_disabled:
                 obj.modifiers.remove(md)
@@ -179,15 +341,41 @@ def apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA'):
             if successfully_applied and obj_to_delete:
                 objects_to_delete.add(obj_to_delete)
     
-    if active_obj in objects_to_delete: active_obj = None
-    
-    for obj in objects_to_delete:
-        scene.objects.unlink(obj)
-    
-    scene.objects.active = active_obj
-    
+    try:
+        for obj in objects:
+            scene.objects.active = obj
+            try:
+                apply_obj(obj)
+            except RuntimeError as exc:
+                failures.append((obj.name, "", exc.args[0].strip()))
+            yield obj
+    finally:
+        for old_mesh, new_mesh in replaced_meshes.items():
+            if old_mesh.users != 0: continue
+            name = old_mesh.name
+            bpy.data.meshes.remove(old_mesh)
+            new_mesh.name = name
+        
+        if active_obj in objects_to_delete: active_obj = None
+        
+        for obj in objects_to_delete:
+            scene.objects.unlink(obj)
+        
+        scene.objects.active = active_obj
+
+def apply_modifiers(objects, scene, idnames, options=(), apply_as='DATA', failures=None):
+    objects_to_delete = set()
+    for obj in iter_apply_modifiers(objects, scene, idnames, options, apply_as, failures, objects_to_delete): pass
     return objects_to_delete
 
+def format_apply_failures(failures, max_count=5):
+    lines = []
+    for obj_name, md_name, message in failures[:max_count]:
+        lines.append("{}{}: {}".format(obj_name, (" / "+md_name if md_name else ""), message))
+    if len(failures) > max_count: lines.append("... and {} more".format(len(failures) - max_count))
+    obj_count = len({failure[0] for failure in failures})
+    return "Failed to apply on {} object(s): {}".format(obj_count, "; ".join(lines))
+
 def add_potential_duplis(objs, parent):
     if parent.dupli_type == 'GROUP':
         if not parent.dupli_group: return
@@ -231,6 +419,143 @@ def iterate_workset(search_in, context=None, obj_types=None, include_duplis=None
 
 #============================================================================#
 
+class ContextOverridable:
+    """Operators known to take their objects only from context members"""
+    idnames = {
+        "object.transform_apply", "object.origin_set", "object.origin_clear",
+        "object.location_clear", "object.rotation_clear", "object.scale_clear",
+        "object.parent_clear", "object.track_clear", "object.constraints_clear",
+        "object.shade_smooth", "object.shade_flat",
+        "mesh.uv_texture_add", "mesh.uv_texture_remove",
+        "mesh.vertex_color_add", "mesh.vertex_color_remove",
+        "mesh.customdata_clear_mask", "mesh.customdata_clear_skin",
+    }
+    prefixes = (
+        "object.modifier_", "object.constraint_", "object.shape_key_",
+        "object.vertex_group_", "object.material_slot_",
+    )
+    
+    # These process all selected_editable_objects in one call (transform_apply
+    # is not here: it aborts entirely if any of the objects has multi-user data)
+    multi_object = {
+        "object.origin_set", "object.origin_clear",
+        "object.location_clear", "object.rotation_clear", "object.scale_clear",
+        "object.parent_clear", "object.track_clear", "object.constraints_clear",
+        "object.shade_smooth", "object.shade_flat",
+    }
+    
+    @classmethod
+    def check(cls, idname):
+        return (idname in cls.idnames) or idname.startswith(cls.prefixes)
+
+def repeatable_actions(history, reports):
+    """
+    Merges operator history entries (most recent first) with Info reports
+    (in log order) into a list of (idname, properties) actions, most recent
+    first. Operators are taken from the history; the report lines that are
+    not operator calls (e.g. property edits) are kept as (None, report).
+    """
+    actions = []
+    history = list(history)
+    i_history = 0
+    ops_prefix = "bpy.ops."
+    for report in reversed(reports):
+        if report.startswith(ops_prefix):
+            idname = report[len(ops_prefix):].split("(", 1)[0]
+            if (i_history < len(history)) and (history[i_history][0] == idname):
+                actions.append(history[i_history])
+                i_history += 1
+            continue
+        try:
+            # unlike "exec", "single" prevents code without statements
+            compile(report, filename="info reports", mode="single")
+        except SyntaxError:
+            continue
+        actions.append((None, report))
+    actions.extend(history[i_history:])
+    return actions
+
+class ActionMacro:
+    """
+    A sequence of (name, idname, properties) actions compiled into a single
+    function with pre-resolved operators and pre-built arguments. If all
+    actions accept context overrides, runs of multi-object actions are
+    invoked once for all objects, and the rest once per object.
+    Actions with idname None are Python statements (e.g. property edits from
+    the Info log) and always run with the actual active/selected state.
+    """
+    def __init__(self, actions):
+        self.names = []
+        localvars = {
+            "bpy":bpy, "print":print, "Exception":Exception,
+            "IndividuallyActiveSelected":IndividuallyActiveSelected,
+            "IndividualContextOverrides":IndividualContextOverrides,
+            "ObjectsContextOverride":ObjectsContextOverride,
+        }
+        
+        steps = [] # (is multi-object, call index)
+        for name, idname, properties in actions:
+            if idname is None:
+                i = len(self.names)
+                self.names.append(name)
+                localvars["code{}".format(i)] = compile(properties, filename="info reports", mode="single")
+                steps.append((False, i, idname))
+                continue
+            try:
+                op = OperatorHistory.resolve(idname)
+            except AttributeError as exc:
+                print("Trying to execute {} resulted in {}".format(name, exc))
+                continue
+            i = len(self.names)
+            self.names.append(name)
+            localvars["op{}".format(i)] = op
+            localvars["args{}".format(i)] = dict(properties)
+            steps.append((idname in ContextOverridable.multi_object, i, idname))
+        
+        self.use_override = all((idname is not None) and ContextOverridable.check(idname) for is_multi, i, idname in steps)
+        
+        tab = "    "
+        lines = []
+        
+        def add_call(indent, i, idname, override):
+            lines.append(indent + "try:")
+            if idname is None:
+                lines.append(indent + tab + "exec(code{})".format(i))
+            else:
+                lines.append(indent + tab + "op{0}({1}**args{0})".format(i, override))
+            lines.append(indent + "except Exception as exc:")
+            lines.append(indent + tab + "print('Trying to execute {{}} resulted in {{}}'.format(names[{}], exc))".format(i))
+        
+        if not self.use_override:
+            # Some of the operators need the actual active/selected state
+            lines.append(tab + "for obj in IndividuallyActiveSelected(objects):")
+            for is_multi, i, idname in steps:
+                add_call(tab*2, i, idname, "")
+        else:
+            prev_multi = None
+            for is_multi, i, idname in steps:
+                if is_multi:
+                    if prev_multi is not True:
+                        lines.append(tab + "override = ObjectsContextOverride(objects, context)")
+                    add_call(tab, i, idname, "override, ")
+                else:
+                    if prev_multi is not False:
+                        lines.append(tab + "for obj, override in IndividualContextOverrides(objects, context):")
+                    add_call(tab*2, i, idname, "override, ")
+                prev_multi = is_multi
+        
+        if not lines: lines.append(tab + "pass")
+        
+        localvars["names"] = self.names
+        code = "def replay(objects, context):\n{}".format("\n".join(lines))
+        #print(code)
+        exec(code, localvars, localvars)
+        self.replay = localvars["replay"]
+    
+    def __call__(self, objects, context=None):
+        if context is None: context = bpy.context
+        self.replay(tuple(objects), context)
+
 @addon.Operator(idname="object.batch_repeat_actions", options={'INTERNAL'}, label="Repeat action(s)", description="Repeat action(s) for selected objects")
 class Operator_batch_repeat_actions:
     exclude_active = True | prop()
@@ -251,29 +576,30 @@ class Operator_batch_repeat_actions:
     def invoke(self, context, event):
         cls = self.__class__
         
-        mouse_context = ui_context_under_coord(event.mouse_x, event.mouse_y)
-        info_context = find_ui_area('INFO')
-        context_override = info_context or mouse_context
+        operator_history.update(context, refresh_last=True)
         
+        # window_manager.operators only has REGISTER operators; other actions
+        # (e.g. property edits) can only be taken from the Info reports, which
+        # requires switching an area to Info and using the clipboard (opt-in)
         reports = []
-        if mouse_context:
-            if context_override and context_override.get("area"):
-                reports = change_monitor.get_reports(context, **context_override)
+        if addon.preferences and addon.preferences.repeat_info_reports:
+            mouse_context = ui_context_under_coord(event.mouse_x, event.mouse_y)
+            info_context = find_ui_area('INFO')
+            context_override = info_context or mouse_context
+            if mouse_context:
+                if context_override and context_override.get("area"):
+                    reports = change_monitor.get_reports(context, **context_override)
         
         self.operations.clear() # important!
-        cls.compiled = []
-        for i, report in enumerate(reversed(reports)):
-            try:
-                # unlike "exec", "single" prevents code without statements
-                cls.compiled.append(compile(report, filename="info reports", mode="single"))
-            except SyntaxError:
-                continue
+        cls.actions = []
+        for i, entry in enumerate(repeatable_actions(operator_history.latest(), reports)):
+            cls.actions.append(entry)
             
             item = self.operations.add()
-            item.name = report
+            item.name = (OperatorHistory.format(entry) if entry[0] else entry[1])
             item.value = (i == 0)
             
-            if len(cls.compiled) >= cls.max_shown_actions: break
+            if len(cls.actions) >= cls.max_shown_actions: break
         
         wm = context.window_manager
         return wm.invoke_props_dialog(self)
@@ -281,8 +607,8 @@ class Operator_batch_repeat_actions:
     def execute(self, context):
         cls = self.__class__
         
-        compiled = cls.compiled
-        cls.compiled = None
+        actions = cls.actions
+        cls.actions = None
         
         if not any(item.value for item in self.operations): return {'CANCELLED'}
         
@@ -294,21 +620,21 @@ class Operator_batch_repeat_actions:
         
         bpy.ops.ed.undo_push(message="Batch Repeat")
         
-        for obj in IndividuallyActiveSelected(selected_objs):
-            for i in range(len(self.operations)-1, -1, -1):
-                item = self.operations[i]
-                if not item.value: continue
-                code = compiled[i]
-                try:
-                    exec(code)
-                except Exception as exc:
-                    print("Trying to execute {} resulted in {}".format(item.name, exc))
+        chosen = []
+        for i in range(len(self.operations)-1, -1, -1):
+            item = self.operations[i]
+            if not item.value: continue
+            idname, properties = actions[i]
+            chosen.append((item.name, idname, properties))
+        
+        macro = ActionMacro(chosen)
+        macro(selected_objs, context)
         
         return {'FINISHED'}
     
     def cancel(self, context):
         cls = self.__class__
-        cls.compiled = None
+        cls.actions = None
     
     def draw(self, context):
         layout = NestedLayout(self.layout)
@@ -340,7 +666,8 @@ class Operator_batch_clear_slots_and_layers:
         
         objects = (bpy.data.objects if self.globally else context.selected_objects)
         
-        for obj in IndividuallyActiveSelected(objects):
+        # shape_key_remove and uv_texture_remove only look at context.object
+        for obj, override in IndividualContextOverrides(objects, context):
             if not obj.data: continue
             data = obj.data
             
@@ -351,12 +678,12 @@ class Operator_batch_clear_slots_and_layers:
                 obj.vertex_groups.clear()
             
             if self.clear_shape_keys and hasattr(data, "shape_keys"):
-                if data.shape_keys: bpy.ops.object.shape_key_remove(all=True)
+                if data.shape_keys: bpy.ops.object.shape_key_remove(override, all=True)
             
             if obj.type == 'MESH':
                 if self.clear_uv_maps:
                     while data.uv_layers:
-                        bpy.ops.mesh.uv_texture_remove()
+                        bpy.ops.mesh.uv_texture_remove(override)
                 
                 if self.clear_vertex_colors:
                     while data.vertex_colors:
@@ -867,6 +1194,13 @@ class Panel_Batch_Operations:
                 layout.operator("object.batch_repeat_actions", icon='PLAY')
                 layout.operator("object.batch_clear_slots_and_layers", icon='GROUP_VCOL')
                 layout.operator("object.batch_streamline_meshes", icon='EDITMODE_HLT')
+        
+        if prefs.show_performance_info:
+            for Category in prefs.categories:
+                with layout.box():
+                    timings = Category.timings
+                    layout.label("{}: {:.1f} ms".format(Category.Category_Name_Plural, timings.total * 1000.0), icon=Category.category_icon)
+                    timings.draw(layout)
 
 #============================================================================#
 
@@ -1620,6 +1954,8 @@ def make_category(globalvars, idname_attr="name", **kwargs):
         selection_info = (0, "")
         default_select_state = None
         
+        timings = RefreshTimings()
+        
         def refresh(self, context, needs_refresh=False):
             cls = self.__class__
             options = get_options()
@@ -1635,9 +1971,16 @@ def make_category(globalvars, idname_attr="name", **kwargs):
             self.next_refresh_time = time.clock() + preferences.refresh_interval
             cls.selection_info = selection_info
             
-            processing_time = time.clock()
+            timings = cls.timings
+            clock = time.clock
             
-            infos = AggregateInfo.collect_info(options.iterate(context, selected=False), is_ID and (options.search_in == 'FILE'))
+            phase_time = clock()
+            workset = tuple(options.iterate(context, selected=False))
+            timings.add("workset", clock() - phase_time)
+            
+            phase_time = clock()
+            infos = AggregateInfo.collect_info(workset, is_ID and (options.search_in == 'FILE'))
+            timings.add("collect_info", clock() - phase_time)
             
             curr_idnames = set(infos.keys())
             curr_idnames.discard("") # necessary for comparison with idnames_in_selected
@@ -1651,9 +1994,11 @@ def make_category(globalvars, idname_attr="name", **kwargs):
                 CategoryPG.rename_id = -1
             cls.prev_idnames = curr_idnames
             
+            phase_time = clock()
             cls.is_anything_selected = bool(context.selected_objects)
             cls.idnames_in_selected = set(name for obj in options.iterate_objects(context, search_in='SELECTION')
                 for name in BatchOperations.iter_idnames(obj))
+            timings.add("selection", clock() - phase_time)
             
             if options.synchronize_selection:
                 cls.excluded = curr_idnames.difference(cls.idnames_in_selected)
@@ -1663,15 +2008,19 @@ def make_category(globalvars, idname_attr="name", **kwargs):
                 if enum_item[0] not in curr_idnames]
             cls.remaining_items.sort(key=lambda item:item[1])
             
+            phase_time = clock()
             self.items.clear()
             for i, key in enumerate(sorted(infos.keys())):
                 item = self.items.add()
                 item.sort_id = i
                 infos[key].fill_item(item, options.aggregate_mode)
+            timings.add("fill", clock() - phase_time)
+            
+            info_all = infos.get("")
+            timings.refreshed(len(self.items), (len(info_all.obj_names) if info_all else 0))
             
-            processing_time = time.clock() - processing_time
             # Disable autorefresh if it takes too much time
-            #if processing_time > 0.05: options.autorefresh = False
+            #if timings.total > 0.05: options.autorefresh = False
             
             self.needs_refresh = False
         
@@ -1679,6 +2028,11 @@ def make_category(globalvars, idname_attr="name", **kwargs):
             self.was_drawn = True
             self.refresh(bpy.context)
             
+            draw_time = time.clock()
+            self.draw_items(layout)
+            self.timings.add("draw", time.clock() - draw_time)
+        
+        def draw_items(self, layout):
             if not self.items: return
             
             options = get_options()
@@ -1703,7 +2057,6 @@ def make_category(globalvars, idname_attr="name", **kwargs):
                         emboss = is_in_selected
                         
                         title = item.name or "(All)"
-                        icon_kw = BatchOperations.icon_kwargs(item.idname)
                         icon_novalue = BatchOperations.icon_kwargs(item.idname, False)["icon"]
                         
                         op = layout.operator("object.batch_{}_extras".format(category_name), text="", icon='DOTSDOWN', emboss=emboss)
@@ -1833,6 +2186,8 @@ def make_category(globalvars, idname_attr="name", **kwargs):
                 layout.prop_menu_enum(options, "search_in", text="", icon=icon)
                 icon = CategoryOptionsPG.paste_mode_icons[options.paste_mode]
                 layout.prop_menu_enum(options, "paste_mode", text="", icon=icon)
+            if addon.preferences.show_performance_info:
+                layout.label("{:.1f} ms".format(CategoryPG.timings.total * 1000.0))
         
         def draw(self, context):
             layout = NestedLayout(self.layout)
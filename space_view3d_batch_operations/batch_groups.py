@@ -57,6 +57,154 @@ category_icon = 'GROUP'
 
 Group = bpy.types.Group
 
+class GroupIndex:
+    """
+    Inverted index of group membership (object -> groups it's part of,
+    group -> objects that instantiate it), built in a single pass and
+    rebuilt lazily after objects/groups are updated or their counts change
+    (link/unlink by scripts doesn't always set is_updated).
+    """
+    parts = {} # object -> list of groups (in bpy.data.groups order)
+    duplis = {} # group -> list of objects
+    stamp = None
+    dirty = True
+    
+    @classmethod
+    def get_stamp(cls):
+        groups = bpy.data.groups
+        return (bpy.data.as_pointer(), len(bpy.data.objects), len(groups),
+            sum(len(group.objects) for group in groups))
+    
+    @classmethod
+    def tag_dirty(cls):
+        cls.dirty = True
+    
+    @classmethod
+    def tag_updated(cls):
+        if cls.dirty: return
+        if bpy.data.groups.is_updated or bpy.data.objects.is_updated:
+            cls.dirty = True
+    
+    @classmethod
+    def ensure(cls):
+        stamp = cls.get_stamp()
+        if (not cls.dirty) and (cls.stamp == stamp): return
+        parts = {}
+        for group in bpy.data.groups:
+            for obj in group.objects:
+                parts.setdefault(obj, []).append(group)
+        duplis = {}
+        for obj in bpy.data.objects:
+            if obj.dupli_group: duplis.setdefault(obj.dupli_group, []).append(obj)
+        cls.parts = parts
+        cls.duplis = duplis
+        cls.stamp = stamp
+        cls.dirty = False
+    
+    # Modifications through these methods keep the index up to date
+    @classmethod
+    def link(cls, group, obj):
+        group.objects.link(obj)
+        if cls.dirty: return
+        cls.parts.setdefault(obj, []).append(group)
+        cls.stamp = cls.get_stamp()
+    
+    @classmethod
+    def unlink(cls, group, obj):
+        group.objects.unlink(obj)
+        if cls.dirty: return
+        groups = cls.parts.get(obj)
+        if groups and (group in groups): groups.remove(group)
+        cls.stamp = cls.get_stamp()
+    
+    @classmethod
+    def set_dupli(cls, obj, group):
+        prev_group = obj.dupli_group
+        obj.dupli_group = group
+        if cls.dirty or (prev_group == group): return
+        if prev_group:
+            instancers = cls.duplis.get(prev_group)
+            if instancers and (obj in instancers): instancers.remove(obj)
+        if group: cls.duplis.setdefault(group, []).append(obj)
+    
+    @classmethod
+    def groups_of(cls, obj):
+        cls.ensure()
+        return cls.parts.get(obj, ())
+    
+    @classmethod
+    def instancers_of(cls, group):
+        cls.ensure()
+        return cls.duplis.get(group, ())
+
+@addon.scene_update_post
+def scene_update_post(scene):
+    GroupIndex.tag_updated()
+
+class MembershipDelta:
+    """
+    Collects the desired membership changes and applies only the difference
+    with the current state (group by group), so re-applying a state that
+    already holds makes no writes at all.
+    """
+    def __init__(self):
+        self.linked = {} # group -> set of objects
+        self.unlinked = {} # group -> set of objects
+        self.duplis = {} # object -> group (or None)
+    
+    def link(self, group, obj):
+        self.linked.setdefault(group, set()).add(obj)
+        objs = self.unlinked.get(group)
+        if objs: objs.discard(obj)
+    
+    def unlink(self, group, obj):
+        self.unlinked.setdefault(group, set()).add(obj)
+        objs = self.linked.get(group)
+        if objs: objs.discard(obj)
+    
+    def set_dupli(self, obj, group):
+        self.duplis[obj] = group
+    
+    def dupli_of(self, obj):
+        return self.duplis.get(obj, obj.dupli_group)
+    
+    def is_part(self, obj, group):
+        if obj in self.linked.get(group, ()): return True
+        if obj in self.unlinked.get(group, ()): return False
+        return group in GroupIndex.groups_of(obj)
+    
+    def apply(self):
+        n_added, n_removed, n_duplis = 0, 0, 0
+        
+        for obj, group in self.duplis.items():
+            if obj.dupli_group != group:
+                GroupIndex.set_dupli(obj, group)
+                n_duplis += 1
+        
+        groups = set(self.linked)
+        groups.update(self.unlinked)
+        for group in sorted(groups, key=(lambda group: group.name)):
+            linked = self.linked.get(group)
+            unlinked = self.unlinked.get(group)
+            if not (linked or unlinked): continue
+            members = set(group.objects)
+            if unlinked:
+                for obj in unlinked.intersection(members):
+                    GroupIndex.unlink(group, obj)
+                    n_removed += 1
+            if linked:
+                for obj in linked.difference(members):
+                    # an object can't be a part of the group it instantiates
+                    if obj.dupli_group == group: continue
+                    GroupIndex.link(group, obj)
+                    n_added += 1
+        
+        self.linked.clear()
+        self.unlinked.clear()
+        self.duplis.clear()
+        
+        print("Batch Groups: {} links added, {} removed, {} dupli groups changed".format(n_added, n_removed, n_duplis))
+
 class BatchOperations:
     clipbuffer = None
     
@@ -71,12 +219,22 @@ class BatchOperations:
             return 'PART'
         return None
     
+    @classmethod
+    def object_groups(cls, obj, consider_dupli=False):
+        # Same result as checking belongs() for every group, but uses the index
+        consider_dupli |= ('CONSIDER_DUPLI' in get_options().group_options)
+        dupli_group = obj.dupli_group
+        groups = [group for group in GroupIndex.groups_of(obj) if group != dupli_group]
+        if dupli_group and consider_dupli: groups.append(dupli_group)
+        return groups
+    
     @classmethod
     def remove_group(cls, group, do_unlink=True):
         if bpy.app.version >= (2, 78, 0):
             bpy.data.groups.remove(group, do_unlink=do_unlink)
         else:
             bpy.data.groups.remove(group)
+        GroupIndex.tag_dirty()
     
     @classmethod
     def group_objects(cls, group):
@@ -90,21 +248,19 @@ class BatchOperations:
         return bpy.data.groups.get(group)
     
     @classmethod
-    def add_group_to_obj(cls, obj, idname):
+    def add_group_to_obj(cls, obj, idname, delta):
         group = cls.to_group(idname)
-        if not group: return
-        # if in dupli-group, can't link either (it would be a circular reference)
-        if obj.name not in group.objects: group.objects.link(obj)
+        if group: delta.link(group, obj)
     
     @classmethod
-    def clear_obj_groups(cls, obj, idnames=None, check_in=True):
-        for group in bpy.data.groups:
+    def clear_obj_groups(cls, obj, delta, idnames=None, check_in=True):
+        for group in cls.object_groups(obj):
             if (idnames is None) or ((group.name in idnames) == check_in):
                 belong = cls.belongs(obj, group)
                 if belong == 'PART':
-                    group.objects.unlink(obj)
+                    delta.unlink(group, obj)
                 elif belong == 'DUPLI':
-                    obj.dupli_group = None
+                    delta.set_dupli(obj, None)
     
     @classmethod
     def clean_name(cls, group):
@@ -112,13 +268,13 @@ class BatchOperations:
     
     @classmethod
     def iter_names(cls, obj):
-        for group in bpy.data.groups:
-            if cls.belongs(obj, group): yield group.name
+        for group in cls.object_groups(obj):
+            yield group.name
     
     @classmethod
     def iter_idnames(cls, obj):
-        for group in bpy.data.groups:
-            if cls.belongs(obj, group): yield group.name
+        for group in cls.object_groups(obj):
+            yield group.name
     
     @classmethod
     def iter_scene_objs_idnames(cls, scene):
@@ -140,8 +296,7 @@ class BatchOperations:
     def iterate(cls, search_in, context=None):
         if search_in != 'FILE':
             for obj in cls.iterate_objects(search_in, context):
-                for group in bpy.data.groups:
-                    if cls.belongs(obj, group): yield group
+                yield from cls.object_groups(obj)
         else:
             yield from bpy.data.groups
     
@@ -213,22 +368,25 @@ class BatchOperations:
                     if obj.name in idnames:
                         _setattr(obj, name, value, **kwargs)
                 else:
-                    for group in bpy.data.groups:
-                        if not cls.belongs(obj, group): continue
+                    for group in cls.object_groups(obj):
                         if group.name in idnames:
-                            _setattr(ms.group, name, value, **kwargs)
+                            _setattr(group, name, value, **kwargs)
     
     @classmethod
     def clear(cls, objects):
+        delta = MembershipDelta()
         for obj in objects:
-            cls.clear_obj_groups(obj)
+            cls.clear_obj_groups(obj, delta)
+        delta.apply()
     
     @classmethod
     def add(cls, objects, idnames):
         idnames = cls.split_idnames(idnames)
+        delta = MembershipDelta()
         for obj in objects:
             for idname in idnames:
-                cls.add_group_to_obj(obj, idname)
+                cls.add_group_to_obj(obj, idname, delta)
+        delta.apply()
     
     @classmethod
     def remove(cls, objects, idnames, from_file=False):
@@ -237,16 +395,15 @@ class BatchOperations:
     @classmethod
     def find_objects(cls, idnames, search_in, context=None):
         idnames = cls.split_idnames(idnames)
-        groups = [group for group in bpy.data.groups if group.name in idnames]
         for obj in cls.iterate_objects(search_in, context):
-            if any(bool(cls.belongs(obj, group)) for group in groups):
+            if any((group.name in idnames) for group in cls.object_groups(obj)):
                 yield obj
     
     @classmethod
     def select(cls, context, idnames, operation='SET'):
         idnames = cls.split_idnames(idnames)
-        groups = [group for group in bpy.data.groups if group.name in idnames]
-        data = {obj:"select" for obj in context.scene.objects if any(bool(cls.belongs(obj, group)) for group in groups)}
+        data = {obj:"select" for obj in context.scene.objects
+            if any((group.name in idnames) for group in cls.object_groups(obj))}
         Selection(context).update(data, operation)
         #for obj in context.scene.objects:
         #    obj.select = any(bool(cls.belongs(obj, group)) for group in groups)
@@ -264,52 +421,48 @@ class BatchOperations:
             cls.remove(None, idnames, True)
             cls.set_attr("use_fake_user", False, None, idnames)
             idnames = cls.split_idnames(idnames)
-            for group in tuple(bpy.data.groups):
-                if group.name in idnames:
-                    cls.remove_group(group)
+            for idname in idnames:
+                group = cls.to_group(idname)
+                if group: cls.remove_group(group)
     
     @classmethod
     def copy(cls, active_obj, exclude=()):
         if not active_obj:
             cls.clipbuffer = []
         else:
-            cls.clipbuffer = [group.name for group in bpy.data.groups
-                if (group.name not in exclude) and cls.belongs(active_obj, group)]
+            cls.clipbuffer = [group.name for group in cls.object_groups(active_obj)
+                if (group.name not in exclude)]
     
     @classmethod
     def paste(cls, objects, paste_mode):
         idnames = cls.clipbuffer
         if idnames is None: return
+        delta = MembershipDelta()
         if paste_mode != 'AND':
             for obj in objects:
-                if paste_mode == 'SET': cls.clear_obj_groups(obj)
+                if paste_mode == 'SET': cls.clear_obj_groups(obj, delta)
                 for idname in idnames:
-                    cls.add_group_to_obj(obj, idname)
+                    cls.add_group_to_obj(obj, idname, delta)
         else:
             for obj in objects:
-                cls.clear_obj_groups(obj, idnames, False)
+                cls.clear_obj_groups(obj, delta, idnames, False)
+        delta.apply()
+    
+    @classmethod
+    def signature(cls, group):
+        # Everything BlRna.compare() would look at, in a hashable form
+        members = frozenset(obj.as_pointer() for obj in group.objects)
+        return (members, tuple(group.dupli_offset), tuple(group.layers))
     
     @classmethod
     def merge_identical(cls):
-        unique = set(bpy.data.groups)
-        identical = []
-        # ignore all properties from bpy_struct
-        ignore = {"name", "id_data", "users", "use_fake_user", "tag", "is_updated", "is_updated_data", "is_library_indirect", "library"}
-        
+        buckets = {}
         for item in bpy.data.groups:
-            duplicates = None
-            unique.discard(item)
-            
-            for item2 in unique:
-                if BlRna.compare(item, item2, ignore=ignore):
-                    if duplicates is None: duplicates = {item}
-                    duplicates.add(item2)
-            
-            if duplicates is not None:
-                identical.append(duplicates)
-                unique.difference_update(duplicates)
+            buckets.setdefault(cls.signature(item), []).append(item)
         
-        for duplicates in identical:
+        replacements = {}
+        for duplicates in buckets.values():
+            if len(duplicates) < 2: continue
             # find best candidate for preservation
             best, best_users, best_len = None, 0, 0
             for item in duplicates:
@@ -319,10 +472,26 @@ class BatchOperations:
                     is_better |= (len(item.name) < best_len)
                     if is_better:
                         best, best_users, best_len = item, item.users, len(item.name)
-            duplicates.discard(best)
-            src_idnames = idnames_separator.join(item.name for item in duplicates)
-            dst_idname = best.name
-            cls.assign('REPLACE', None, None, src_idnames, dst_idname, from_file=True, purge=True)
+            for item in duplicates:
+                if item != best: replacements[item] = best
+        
+        if not replacements: return
+        
+        # Members are the same, so only the dupli_group references need rewiring
+        for obj in bpy.data.objects:
+            best = replacements.get(obj.dupli_group)
+            if best: GroupIndex.set_dupli(obj, best)
+        for particles in bpy.data.particles:
+            best = replacements.get(particles.dupli_group)
+            if best: particles.dupli_group = best
+        
+        for item in replacements:
+            if bpy.app.version < (2, 78, 0):
+                # no do_unlink option, the group must have no users
+                for obj in tuple(item.objects):
+                    GroupIndex.unlink(item, obj)
+            item.use_fake_user = False
+            cls.remove_group(item)
     
     assign_mode_default = 'ADD'
     assign_mode_default1 = 'FILTER'
@@ -338,6 +507,8 @@ class BatchOperations:
         src_idnames = cls.split_idnames(src_idnames) # can be None
         dst_idnames = cls.split_idnames(dst_idnames)
         
+        delta = MembershipDelta()
+        
         if assign_mode == 'ADD': # previously known as "Ensure"
             for obj in objects:
                 existing_idnames = set(cls.iter_idnames(obj))
@@ -345,19 +516,36 @@ class BatchOperations:
                 idnames_to_add.discard("")
                 
                 for idname in idnames_to_add:
-                    cls.add_group_to_obj(obj, idname)
+                    cls.add_group_to_obj(obj, idname, delta)
+            
+            delta.apply()
         elif assign_mode == 'FILTER':
             for obj in objects:
-                for group in bpy.data.groups:
-                    if not cls.belongs(obj, group): continue
+                for group in cls.object_groups(obj):
                     if group.name not in dst_idnames:
-                        group.objects.unlink(obj)
+                        if group == obj.dupli_group:
+                            delta.set_dupli(obj, None)
+                        else:
+                            delta.unlink(group, obj)
+            
+            delta.apply()
         else:
             replaced_idnames = set()
             
             dst_groups = set(cls.to_group(idname) for idname in sorted(dst_idnames) if idname)
+            dst_groups.discard(None)
             
-            objects = (bpy.data.objects if from_file else tuple(objects)) # need to iterate multiple times
+            if from_file and (src_idnames is not None) and (assign_mode == 'REPLACE'):
+                # Only the members/instancers of the replaced groups are affected
+                affected = set()
+                for idname in src_idnames:
+                    group = cls.to_group(idname)
+                    if not group: continue
+                    affected.update(group.objects)
+                    affected.update(GroupIndex.instancers_of(group))
+                objects = tuple(affected)
+            else:
+                objects = (bpy.data.objects if from_file else tuple(objects)) # need to iterate multiple times
             
             if assign_mode == 'REPLACE':
                 def should_replace(group):
@@ -367,23 +555,23 @@ class BatchOperations:
                     return False
                 
                 for obj in objects:
-                    for group in bpy.data.groups:
+                    for group in cls.object_groups(obj, True):
                         belong = cls.belongs(obj, group, True)
                         if not belong: continue
                         
                         if should_replace(group):
                             if belong == 'PART':
-                                group.objects.unlink(obj)
+                                delta.unlink(group, obj)
                                 
                                 for dst_group in dst_groups:
-                                    if not cls.belongs(obj, dst_group, True):
-                                        dst_group.objects.link(obj)
+                                    if delta.dupli_of(obj) != dst_group:
+                                        delta.link(dst_group, obj)
                             elif belong == 'DUPLI':
-                                obj.dupli_group = None
+                                delta.set_dupli(obj, None)
                                 
                                 for dst_group in dst_groups:
-                                    if not cls.belongs(obj, dst_group, True):
-                                        obj.dupli_group = dst_group
+                                    if not delta.is_part(obj, dst_group):
+                                        delta.set_dupli(obj, dst_group)
             else:
                 def should_replace(group):
                     if (group.name not in dst_idnames):
@@ -392,27 +580,29 @@ class BatchOperations:
                     return False
                 
                 for obj in objects:
-                    for group in bpy.data.groups:
+                    for group in cls.object_groups(obj, True):
                         belong = cls.belongs(obj, group, True)
                         if not belong: continue
                         
                         if should_replace(group):
                             if belong == 'PART':
-                                group.objects.unlink(obj)
+                                delta.unlink(group, obj)
                             elif belong == 'DUPLI':
-                                obj.dupli_group = None
+                                delta.set_dupli(obj, None)
                     
                     for dst_group in dst_groups:
-                        if not cls.belongs(obj, dst_group, True):
-                            dst_group.objects.link(obj)
+                        if delta.dupli_of(obj) != dst_group:
+                            delta.link(dst_group, obj)
+            
+            delta.apply()
             
             replaced_idnames.difference_update(dst_idnames)
             
             if purge and replaced_idnames:
                 cls.set_attr("use_fake_user", False, None, replaced_idnames)
-                for group in tuple(bpy.data.groups):
-                    if group.name in replaced_idnames:
-                        cls.remove_group(group)
+                for idname in replaced_idnames:
+                    group = cls.to_group(idname)
+                    if group: cls.remove_group(group)
 
 #============================================================================#
 
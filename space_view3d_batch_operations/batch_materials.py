@@ -21,8 +21,12 @@ import bpy
 
 import time
 import json
+import hashlib
+import os
+import sys
+import multiprocessing
 
-from mathutils import Vector
+from mathutils import Vector, Matrix
 
 try:
     import dairin0d
@@ -41,7 +45,7 @@ from {0}dairin0d.utils_addon import AddonManager
 """.format(dairin0d_location))
 
 from .batch_common import (
-    LeftRightPanel, make_category, idnames_separator, iterate_workset
+    LeftRightPanel, make_category, idnames_separator, iterate_workset, hashable_value
 )
 
 addon = AddonManager()
@@ -58,6 +62,87 @@ category_icon = 'MATERIAL'
 Material = bpy.types.Material
 MaterialSlot = bpy.types.MaterialSlot
 
+class MaterialUsers:
+    """
+    Inverted index: material -> (objects with it in their slots, datas with it in their materials).
+    Rebuilt lazily (in one pass) when datablock counts change or slots are modified.
+    """
+    users = {}
+    stamp = None
+    dirty = True
+    data_collections = ("meshes", "curves", "metaballs")
+    empty = (frozenset(), frozenset())
+    
+    @classmethod
+    def get_stamp(cls):
+        stamp = [bpy.data.as_pointer(), len(bpy.data.objects), len(bpy.data.materials)]
+        stamp.extend(len(getattr(bpy.data, name)) for name in cls.data_collections)
+        return tuple(stamp)
+    
+    @classmethod
+    def tag_dirty(cls):
+        cls.dirty = True
+    
+    @classmethod
+    def tag_updated(cls):
+        if cls.dirty: return
+        if bpy.data.objects.is_updated or any(getattr(bpy.data, name).is_updated for name in cls.data_collections):
+            cls.dirty = True
+    
+    @classmethod
+    def rebuild(cls):
+        users = {}
+        for obj in bpy.data.objects:
+            for ms in obj.material_slots:
+                mat = ms.material
+                if mat: users.setdefault(mat, (set(), set()))[0].add(obj)
+        for name in cls.data_collections:
+            for data in getattr(bpy.data, name):
+                for mat in data.materials:
+                    if mat: users.setdefault(mat, (set(), set()))[1].add(data)
+        cls.users = users
+        cls.stamp = cls.get_stamp()
+        cls.dirty = False
+    
+    @classmethod
+    def replace(cls, src_materials, dst_material):
+        """Move the users of src_materials to dst_material (all their occurrences must have been replaced)"""
+        if cls.dirty or (cls.stamp != cls.get_stamp()): return # will be rebuilt anyway
+        dst_objs, dst_datas = None, None
+        for mat in src_materials:
+            objs, datas = cls.users.pop(mat, cls.empty)
+            if (not dst_material) or (not (objs or datas)): continue
+            if dst_objs is None: dst_objs, dst_datas = cls.users.setdefault(dst_material, (set(), set()))
+            dst_objs.update(objs)
+            dst_datas.update(datas)
+    
+    @classmethod
+    def update_stamp(cls):
+        """Accept the current datablock counts (e.g. after removing materials whose users were moved)"""
+        if not cls.dirty: cls.stamp = cls.get_stamp()
+    
+    @classmethod
+    def get(cls, mat):
+        stamp = cls.get_stamp()
+        if cls.dirty or (cls.stamp != stamp): cls.rebuild()
+        return cls.users.get(mat, cls.empty)
+    
+    @classmethod
+    def objects_using(cls, idnames):
+        objects = set()
+        for idname in idnames:
+            mat = bpy.data.materials.get(idname)
+            if mat: objects.update(cls.get(mat)[0])
+        return objects
+    
+    @classmethod
+    def datas_using(cls, idnames):
+        datas = set()
+        for idname in idnames:
+            mat = bpy.data.materials.get(idname)
+            if mat: datas.update(cls.get(mat)[1])
+        return datas
+
 class BatchOperations:
     clipbuffer = None
     
@@ -69,9 +154,9 @@ class BatchOperations:
     
     @classmethod
     def set_material_slot(cls, obj, ms, material):
-        max_users = (2 if obj.data.use_fake_user else 1)
-        if (obj.data.users > max_users): ms.link = 'OBJECT'
+        if cls.slot_link(obj): ms.link = 'OBJECT'
         ms.material = material
+        MaterialUsers.tag_dirty()
     
     @classmethod
     def add_material_to_obj(cls, obj, idname):
@@ -86,6 +171,64 @@ class BatchOperations:
             ms = obj.material_slots[len(obj.material_slots)-1]
             cls.set_material_slot(obj, ms, material)
     
+    @classmethod
+    def slot_link(cls, obj):
+        max_users = (2 if obj.data.use_fake_user else 1)
+        return ('OBJECT' if (obj.data.users > max_users) else None)
+    
+    @classmethod
+    def plan_additions(cls, obj, materials):
+        # Same slot choice as add_material_to_obj(): first free slot, else a new one
+        slots = [None] * len(obj.material_slots) # None = keep the slot as is
+        free = [i for i, ms in enumerate(obj.material_slots) if not ms.material]
+        free.reverse()
+        link = cls.slot_link(obj)
+        for material in materials:
+            if not material: continue
+            if free:
+                i = free.pop()
+            else:
+                i = len(slots)
+                slots.append(None)
+            slots[i] = (material, link)
+        return slots
+    
+    @classmethod
+    def assign_slots(cls, mapping):
+        """
+        Bulk slot assignment: mapping is {object: [(material, link) or None, ...]},
+        where link is 'OBJECT', 'DATA' or None (keep the slot's current link).
+        Slot arrays are sized once per data, and shared datas are written once.
+        """
+        sizes = {}
+        for obj, entries in mapping.items():
+            data = obj.data
+            sizes[data] = max(sizes.get(data, len(data.materials)), len(entries))
+        
+        for data, size in sizes.items():
+            for i in range(size - len(data.materials)):
+                data.materials.append(None)
+        
+        data_writes = {}
+        for obj, entries in mapping.items():
+            material_slots = obj.material_slots
+            for i, entry in enumerate(entries):
+                if entry is None: continue
+                material, link = entry
+                ms = material_slots[i]
+                if link: ms.link = link
+                if ms.link == 'OBJECT':
+                    ms.material = material
+                else:
+                    data_writes.setdefault(obj.data, {})[i] = material
+        
+        for data, writes in data_writes.items():
+            materials = data.materials
+            for i in sorted(writes):
+                materials[i] = writes[i]
+        
+        MaterialUsers.tag_dirty()
+    
     @classmethod
     def clear_obj_materials(cls, obj, idnames=None, check_in=True):
         for ms in obj.material_slots:
@@ -152,33 +295,38 @@ class BatchOperations:
         mat = bpy.data.materials.new(idname)
         return mat.name
     
+    @classmethod
+    def set_fake_users(cls, materials, value):
+        materials = [mat for mat in materials if mat]
+        
+        if value:
+            # can't set use_fake_user if 0 users
+            to_link = [mat for mat in materials if mat.users == 0]
+        else:
+            # can't unset use_fake_user if fake is the only user
+            to_link = [mat for mat in materials if mat.users == 1]
+        
+        # All materials that need a temporary user share one helper mesh
+        mesh = None
+        if to_link:
+            mesh = bpy.data.meshes.new("TmpMesh")
+            for mat in to_link:
+                mesh.materials.append(mat)
+        
+        for mat in materials:
+            mat.use_fake_user = value
+        
+        if mesh:
+            for i in range(len(mesh.materials)-1, -1, -1):
+                mesh.materials.pop(i)
+            bpy.data.meshes.remove(mesh)
+    
     @classmethod
     def set_attr(cls, name, value, objects, idnames, **kwargs):
         idnames = cls.split_idnames(idnames)
         
         if name == "use_fake_user":
-            mesh = None
-            
-            for idname in idnames:
-                mat = cls.to_material(idname)
-                if not mat: continue
-                
-                if value:
-                    # can't set use_fake_user if 0 users
-                    if mat.users == 0:
-                        if mesh is None: mesh = bpy.data.meshes.new("TmpMesh")
-                        mesh.materials.append(mat)
-                else:
-                    # can't unset use_fake_user if fake is the only user
-                    if mat.users == 1:
-                        if mesh is None: mesh = bpy.data.meshes.new("TmpMesh")
-                        mesh.materials.append(mat)
-                
-                mat.use_fake_user = value
-                
-                if mesh and (len(mesh.materials) > 0): mesh.materials.pop(0)
-            
-            if mesh: bpy.data.meshes.remove(mesh)
+            cls.set_fake_users((cls.to_material(idname) for idname in idnames), value)
         else:
             use_kwargs = False
             
@@ -208,9 +356,8 @@ class BatchOperations:
     @classmethod
     def add(cls, objects, idnames):
         idnames = cls.split_idnames(idnames)
-        for obj in objects:
-            for idname in idnames:
-                cls.add_material_to_obj(obj, idname)
+        materials = [cls.to_material(idname) for idname in idnames]
+        cls.assign_slots({obj:cls.plan_additions(obj, materials) for obj in objects})
     
     @classmethod
     def remove(cls, objects, idnames, from_file=False):
@@ -219,14 +366,15 @@ class BatchOperations:
     @classmethod
     def find_objects(cls, idnames, search_in, context=None):
         idnames = cls.split_idnames(idnames)
+        users = MaterialUsers.objects_using(idnames)
         for obj in cls.iterate_objects(search_in, context):
-            if any((ms.name in idnames) for ms in obj.material_slots):
-                yield obj
+            if obj in users: yield obj
     
     @classmethod
     def select(cls, context, idnames, operation='SET'):
         idnames = cls.split_idnames(idnames)
-        data = {obj:"select" for obj in context.scene.objects if any((ms.name in idnames) for ms in obj.material_slots)}
+        users = MaterialUsers.objects_using(idnames)
+        data = {obj:"select" for obj in context.scene.objects if obj in users}
         Selection(context).update(data, operation)
         #for obj in context.scene.objects:
         #    obj.select = any((ms.name in idnames) for ms in obj.material_slots)
@@ -244,9 +392,10 @@ class BatchOperations:
             cls.remove(None, idnames, True)
             cls.set_attr("use_fake_user", False, None, idnames)
             idnames = cls.split_idnames(idnames)
-            for mat in tuple(bpy.data.materials):
-                if mat.name in idnames:
-                    bpy.data.materials.remove(mat)
+            for idname in idnames:
+                mat = bpy.data.materials.get(idname)
+                if mat: bpy.data.materials.remove(mat)
+            MaterialUsers.tag_dirty()
     
     @classmethod
     def copy(cls, active_obj, exclude=()):
@@ -260,20 +409,68 @@ class BatchOperations:
         idnames = cls.clipbuffer
         if idnames is None: return
         if paste_mode != 'AND':
+            materials = [cls.to_material(idname) for idname in idnames]
+            mapping = {}
             for obj in objects:
                 if paste_mode == 'SET': cls.clear_obj_materials(obj)
-                for idname in idnames:
-                    cls.add_material_to_obj(obj, idname)
+                mapping[obj] = cls.plan_additions(obj, materials)
+            cls.assign_slots(mapping)
         else:
             for obj in objects:
                 cls.clear_obj_materials(obj, idnames, False)
     
+    # ignore all properties from bpy_struct
+    compare_ignore = {"name", "id_data", "users", "use_fake_user", "tag", "is_updated", "is_updated_data", "is_library_indirect", "library"}
+    
+    @classmethod
+    def fingerprint(cls, material, ignore=()):
+        # Only the scalar properties and the node tree are taken into account
+        # (pointers and collections are compared recursively by BlRna.compare).
+        # The result is stable across sessions, so it can be stored in a file.
+        state = []
+        for name, rna_prop in BlRna.properties(material):
+            if name in ignore: continue
+            if name == "node_tree":
+                node_tree = material.node_tree
+                state.append(NodeTreeComparer.digest(node_tree) if node_tree else None)
+            elif rna_prop.type not in {'POINTER', 'COLLECTION'}:
+                value = getattr(material, name)
+                if isinstance(value, set): value = sorted(value)
+                state.append(hashable_value(value))
+        return hashlib.md5(repr(state).encode()).hexdigest()
+    
+    pool_min_materials = 256 # below this, starting the worker processes isn't worth it
+    
+    @classmethod
+    def compare_in_pool(cls, buckets, n_workers):
+        # Materials are serialized here (bpy is not available in the workers),
+        # the workers find the groups of equal states
+        def node_tree_state(node_tree):
+            if node_tree is None: return None
+            # ignore grease pencil
+            return (plain_state(node_tree.animation_data), NodeTreeComparer.nodetree_key(node_tree))
+        specials = {"node_tree":node_tree_state}
+        
+        order = {item:i for i, item in enumerate(bpy.data.materials)}
+        materials = []
+        tasks = []
+        for bucket in buckets:
+            task = []
+            for item in sorted(bucket, key=order.get):
+                task.append((len(materials), plain_state(item, cls.compare_ignore, specials)))
+                materials.append(item)
+            tasks.append(task)
+        
+        with multiprocessing.get_context("fork").Pool(n_workers) as pool:
+            results = pool.map(group_equal_states, tasks)
+        
+        return [{materials[i] for i in indices} for groups in results for indices in groups]
+    
     @classmethod
     def merge_identical(cls):
         unique = set(bpy.data.materials)
         identical = []
-        # ignore all properties from bpy_struct
-        ignore = {"name", "id_data", "users", "use_fake_user", "tag", "is_updated", "is_updated_data", "is_library_indirect", "library"}
+        ignore = cls.compare_ignore
         
         def compare_node_tree(rna_prop, valueA, valueB):
             if (valueA is None) and (valueB is None): return True
@@ -285,18 +482,35 @@ class BatchOperations:
             return ntkA == ntkB
         specials = {"node_tree":compare_node_tree}
         
-        for item in bpy.data.materials:
-            duplicates = None
-            unique.discard(item)
-            
-            for item2 in unique:
-                if BlRna.compare(item, item2, ignore=ignore, specials=specials):
-                    if duplicates is None: duplicates = {item}
-                    duplicates.add(item2)
-            
-            if duplicates is not None:
-                identical.append(duplicates)
-                unique.difference_update(duplicates)
+        # Identical materials always have equal fingerprints, so the full
+        # comparison only needs to be done within the same bucket
+        fingerprints = {item:MaterialFingerprints.get(item) for item in bpy.data.materials}
+        buckets = {}
+        for item, fingerprint in fingerprints.items():
+            buckets.setdefault(fingerprint, set()).add(item)
+        
+        candidates = [bucket for bucket in buckets.values() if len(bucket) > 1]
+        n_workers = (addon.preferences.merge_workers if addon.preferences else 0)
+        n_candidates = sum(len(bucket) for bucket in candidates)
+        
+        if (n_workers > 0) and (n_candidates >= cls.pool_min_materials) and can_fork:
+            identical = cls.compare_in_pool(candidates, n_workers)
+        else:
+            for item in bpy.data.materials:
+                duplicates = None
+                bucket = buckets[fingerprints[item]]
+                unique.discard(item)
+                bucket.discard(item)
+                
+                for item2 in bucket:
+                    if BlRna.compare(item, item2, ignore=ignore, specials=specials):
+                        if duplicates is None: duplicates = {item}
+                        duplicates.add(item2)
+                
+                if duplicates is not None:
+                    identical.append(duplicates)
+                    unique.difference_update(duplicates)
+                    bucket.difference_update(duplicates)
         
         for duplicates in identical:
             # find best candidate for preservation
@@ -342,6 +556,7 @@ class BatchOperations:
                         cls.set_material_slot(obj, ms, None)
         else:
             replaced_idnames = set()
+            update_users = False
             
             def should_replace(mat):
                 if (src_idnames is None) or (mat and (mat.name in src_idnames)):
@@ -369,14 +584,26 @@ class BatchOperations:
                         for i in range(len(dst_materials), len(obj.material_slots)):
                             obj.data.materials.pop(len(obj.material_slots)-1, update_data=True)
             else:
-                for obj in bpy.data.objects:
+                if (src_idnames is not None) and (assign_mode == 'REPLACE'):
+                    # Only the actual users of the replaced materials are affected
+                    objs = MaterialUsers.objects_using(src_idnames)
+                    datas_lists = [MaterialUsers.datas_using(src_idnames)]
+                    # With a single destination every occurrence is replaced by it,
+                    # so the index can be updated in place instead of being rebuilt
+                    # (merge_identical does this once per group of duplicates)
+                    update_users = (len(dst_materials) == 1)
+                else:
+                    objs = bpy.data.objects
+                    datas_lists = [getattr(bpy.data, name) for name in MaterialUsers.data_collections]
+                
+                for obj in objs:
                     i_repl = 0
                     for ms in obj.material_slots:
                         if should_replace(ms.material):
                             ms.material = dst_materials[i_repl]
                             i_repl = (i_repl + 1) % len(dst_materials)
                 
-                for datas in (bpy.data.meshes, bpy.data.curves, bpy.data.metaballs):
+                for datas in datas_lists:
                     for data in datas:
                         i_repl = 0
                         for i in range(len(data.materials)):
@@ -395,11 +622,81 @@ class BatchOperations:
             
             replaced_idnames.difference_update(dst_idnames)
             
+            if update_users:
+                src_materials = [bpy.data.materials.get(idname) for idname in replaced_idnames]
+                MaterialUsers.replace([mat for mat in src_materials if mat], dst_materials[0])
+            
             if purge and replaced_idnames:
                 cls.set_attr("use_fake_user", False, None, replaced_idnames)
-                for mat in tuple(bpy.data.materials):
-                    if mat.name in replaced_idnames:
-                        bpy.data.materials.remove(mat)
+                for idname in replaced_idnames:
+                    mat = bpy.data.materials.get(idname)
+                    if mat: bpy.data.materials.remove(mat)
+            
+            if update_users:
+                MaterialUsers.update_stamp()
+                return
+        
+        MaterialUsers.tag_dirty()
+
+def plain_value(rna_prop, value):
+    if isinstance(value, Matrix): return tuple(tuple(row) for row in value)
+    if isinstance(value, set): return frozenset(value)
+    if isinstance(value, str): return value
+    if hasattr(value, "__len__"): return tuple(value) # fixed and dynamic arrays, vectors
+    return value
+
+def plain_pointer(value, path):
+    if value is None: return None
+    # Like in BlRna.compare(), idblocks are used only by reference
+    # (this also avoids reading textures, images, etc. of every material)
+    if isinstance(value, bpy.types.ID): return (value.__class__.__name__, value.as_pointer())
+    return plain_state(value, path=path)
+
+def plain_state(obj, ignore=(), specials={}, path=()):
+    """
+    Plain (picklable, hashable) counterpart of BlRna.compare():
+    states of two objects are equal if and only if compare() returns True
+    """
+    if obj is None: return None
+    pointer = obj.as_pointer()
+    if pointer in path: return ("<cycle>", pointer)
+    path = path + (pointer,)
+    state = []
+    for name, rna_prop in BlRna.properties(obj):
+        if name in ignore: continue
+        value = getattr(obj, name)
+        if name in specials:
+            state.append(specials[name](value))
+        elif rna_prop.type == 'POINTER':
+            state.append(plain_pointer(value, path))
+        elif rna_prop.type == 'COLLECTION':
+            state.append(tuple(plain_pointer(item, path) for item in value))
+        else:
+            state.append(plain_value(rna_prop, value))
+    return tuple(state)
+
+def group_equal_states(states):
+    """Runs in worker processes: returns lists of indices of equal (index, state) items"""
+    by_hash = {}
+    for index, state in states:
+        by_hash.setdefault(hash(state), []).append((index, state))
+    groups = []
+    for items in by_hash.values():
+        classes = []
+        for index, state in items:
+            for class_state, indices in classes:
+                if class_state == state:
+                    indices.append(index)
+                    break
+            else:
+                classes.append((state, [index]))
+        groups.extend(indices for class_state, indices in classes if len(indices) > 1)
+    return groups
+
+# Workers inherit the already imported modules only with "fork". On macOS
+# forking a multithreaded process (Blender) is unsafe even where "fork" is
+# listed, so the pool is used on Linux only; elsewhere we compare in-process.
+can_fork = sys.platform.startswith("linux") and ("fork" in multiprocessing.get_all_start_methods())
 
 class NodeTreeComparer:
     @classmethod
@@ -451,6 +748,170 @@ class NodeTreeComparer:
     @classmethod
     def nodetree_key(cls, nodetree):
         return frozenset(cls.node_key(node) for node in nodetree.nodes)
+    
+    # Structural (name-independent) digests, cached per node tree
+    _digests = {} # node tree pointer -> (stamp, digest)
+    _blend_hash = None
+    refine_iterations = 3
+    
+    @staticmethod
+    def _hash(value):
+        # stable across sessions (unlike the builtin hash() of strings)
+        return hashlib.md5(repr(value).encode()).hexdigest()
+    
+    @classmethod
+    def node_label(cls, node):
+        def sockets_key(sockets):
+            return sorted((socket.bl_idname, socket.identifier, socket.enabled, socket.type,
+                (BlRna.serialize_value(socket.default_value) if hasattr(socket, "default_value") else None))
+                for socket in sockets)
+        internal_links = sorted((link.from_socket.identifier, link.to_socket.identifier)
+            for link in node.internal_links)
+        return cls._hash((node.bl_idname, sockets_key(node.inputs), sockets_key(node.outputs), internal_links))
+    
+    @classmethod
+    def structural_hash(cls, nodetree):
+        # Weisfeiler-Lehman-style refinement: each iteration mixes the labels
+        # of linked nodes into a node's label, so node names don't matter
+        labels = {node.name:cls.node_label(node) for node in nodetree.nodes}
+        links = [(link.from_node.name, link.from_socket.identifier, link.to_node.name, link.to_socket.identifier)
+            for link in nodetree.links]
+        for i in range(cls.refine_iterations):
+            neighbors = {name:[] for name in labels}
+            for from_name, from_id, to_name, to_id in links:
+                neighbors[to_name].append(("in", to_id, from_id, labels[from_name]))
+                neighbors[from_name].append(("out", from_id, to_id, labels[to_name]))
+            labels = {name:cls._hash((label, sorted(neighbors[name]))) for name, label in labels.items()}
+        return cls._hash((sorted(labels.values()), len(links)))
+    
+    @classmethod
+    def digest(cls, nodetree):
+        key = nodetree.as_pointer()
+        stamp = (len(nodetree.nodes), len(nodetree.links))
+        cached = cls._digests.get(key)
+        if cached and (cached[0] == stamp): return cached[1]
+        digest = cls.structural_hash(nodetree)
+        cls._digests[key] = (stamp, digest)
+        return digest
+    
+    @classmethod
+    def tag_updated(cls):
+        blend_hash = bpy.data.as_pointer()
+        if cls._blend_hash != blend_hash: # undo or file load
+            cls._blend_hash = blend_hash
+            cls._digests.clear()
+            return
+        if not cls._digests: return
+        if bpy.data.materials.is_updated:
+            for material in bpy.data.materials:
+                nodetree = material.node_tree
+                if not nodetree: continue
+                if material.is_updated or material.is_updated_data or nodetree.is_updated:
+                    cls._digests.pop(nodetree.as_pointer(), None)
+        if bpy.data.node_groups.is_updated:
+            for nodetree in bpy.data.node_groups:
+                if nodetree.is_updated or nodetree.is_updated_data:
+                    cls._digests.pop(nodetree.as_pointer(), None)
+
+class MaterialFingerprints:
+    """
+    Session cache of material fingerprints, keyed by (name, library path).
+    An entry is reused while the material is not tagged as updated and its
+    node tree has the same node/link counts. The cache can optionally be
+    stored in a sidecar file next to the .blend; the file is ignored if the
+    .blend was saved without updating it (e.g. in a session without the addon).
+    """
+    entries = {} # (name, library path) -> (stamp, fingerprint)
+    file_suffix = ".batch_fingerprints.json"
+    _blend_hash = None
+    
+    @staticmethod
+    def key(material):
+        return (material.name, (material.library.filepath if material.library else ""))
+    
+    @staticmethod
+    def stamp(material):
+        nodetree = material.node_tree
+        if not nodetree: return (-1, -1)
+        return (len(nodetree.nodes), len(nodetree.links))
+    
+    @classmethod
+    def get(cls, material):
+        key = cls.key(material)
+        stamp = cls.stamp(material)
+        entry = cls.entries.get(key)
+        if entry and (entry[0] == stamp): return entry[1]
+        fingerprint = BatchOperations.fingerprint(material, BatchOperations.compare_ignore)
+        cls.entries[key] = (stamp, fingerprint)
+        return fingerprint
+    
+    @classmethod
+    def tag_updated(cls):
+        blend_hash = bpy.data.as_pointer()
+        if cls._blend_hash != blend_hash: # undo (states after it are unknown)
+            cls._blend_hash = blend_hash
+            cls.entries.clear()
+            return
+        if not cls.entries: return
+        if not bpy.data.materials.is_updated: return
+        for material in bpy.data.materials:
+            if material.is_updated or material.is_updated_data:
+                cls.entries.pop(cls.key(material), None)
+    
+    @classmethod
+    def use_file(cls):
+        return bool(addon.preferences and addon.preferences.use_fingerprints_file and bpy.data.filepath)
+    
+    @staticmethod
+    def blend_stamp():
+        stat = os.stat(bpy.data.filepath)
+        return [stat.st_mtime, stat.st_size]
+    
+    @classmethod
+    def load(cls):
+        cls.entries.clear()
+        cls._blend_hash = bpy.data.as_pointer()
+        if not cls.use_file(): return
+        path = bpy.data.filepath + cls.file_suffix
+        if not os.path.isfile(path): return
+        try:
+            with open(path, "r") as f:
+                data = json.load(f)
+            if data["blend"] != cls.blend_stamp(): return # stale: saved by another session
+            for name, library, stamp, fingerprint in data["entries"]:
+                cls.entries[(name, library)] = (tuple(stamp), fingerprint)
+        except (IOError, OSError, ValueError, TypeError, KeyError):
+            cls.entries.clear() # corrupt/incompatible file, just ignore it
+    
+    @classmethod
+    def save(cls):
+        if not cls.use_file(): return
+        keys = {cls.key(material) for material in bpy.data.materials}
+        entries = [(key[0], key[1], stamp, fingerprint)
+            for key, (stamp, fingerprint) in cls.entries.items() if key in keys]
+        path = bpy.data.filepath + cls.file_suffix
+        try:
+            # save_post: the .blend is already written, so its stamp is final
+            data = {"blend":cls.blend_stamp(), "entries":entries}
+            with open(path, "w") as f:
+                json.dump(data, f)
+        except (IOError, OSError):
+            pass
+
+@addon.scene_update_post
+def scene_update_post(scene):
+    NodeTreeComparer.tag_updated()
+    MaterialFingerprints.tag_updated()
+    MaterialUsers.tag_updated()
+
+@addon.load_post
+def load_post():
+    MaterialFingerprints.load()
+
+@bpy.app.handlers.persistent
+def save_post(dummy):
+    MaterialFingerprints.save()
+addon.handler_append("save_post", save_post)
 
 #============================================================================#
 
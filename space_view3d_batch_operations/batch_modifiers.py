@@ -21,6 +21,10 @@ import bpy
 
 import time
 import json
+import keyword
+import hashlib
+
+from array import array
 
 from mathutils import Vector
 
@@ -31,7 +35,6 @@ except ImportError:
     dairin0d_location = "."
 
 exec("""
-from {0}dairin0d.utils_python import copyattrs, attrs_to_dict, dict_to_attrs
 from {0}dairin0d.utils_view3d import SmartView3D
 from {0}dairin0d.utils_blender import Selection, BlUtil
 from {0}dairin0d.utils_userinput import KeyMapUtils
@@ -42,7 +45,8 @@ from {0}dairin0d.utils_addon import AddonManager
 """.format(dairin0d_location))
 
 from .batch_common import (
-    LeftRightPanel, make_category, idnames_separator, iterate_workset, apply_modifiers
+    LeftRightPanel, make_category, idnames_separator, iterate_workset, apply_modifiers,
+    iter_apply_modifiers, format_apply_failures, modifier_params, hashable_value
 )
 
 addon = AddonManager()
@@ -58,6 +62,221 @@ category_icon = 'MODIFIER'
 
 Modifier = bpy.types.Modifier
 
+class ModifierCopier:
+    """
+    Copies writable rna properties between modifiers of the same type.
+    The copy functions and the property schema (names, kinds, defaults)
+    are built once per modifier type (instead of walking dir() and
+    catching errors for every attribute of every modifier).
+    """
+    _cache = {}
+    _unknown = object() # never equal to anything, so the value is always stored
+    
+    @classmethod
+    def get(cls, md):
+        copier = cls._cache.get(md.type)
+        if copier is None:
+            copier = cls(md)
+            cls._cache[md.type] = copier
+        return copier
+    
+    @staticmethod
+    def set_safe(dst, name, value):
+        # ID pointers can be rejected by poll functions (e.g. self-reference)
+        # or refer to datablocks that were deleted since the copy was made;
+        # dynamic enums may not have the value's item in the destination
+        # (e.g. layers_vgroup_select_src='BONE_DEFORM' on an unrigged object)
+        try:
+            setattr(dst, name, value)
+        except (TypeError, ValueError, ReferenceError):
+            pass
+    
+    @classmethod
+    def baseline(cls, md_type, array_names):
+        # modifiers.new() initializes modifiers from DNA defaults (e.g. Mirror
+        # use_x=True, show_viewport=True), not from RNA defaults, so
+        # the values of a freshly created modifier are the real baseline
+        mesh = bpy.data.meshes.new("TmpMesh")
+        obj = bpy.data.objects.new("TmpObj", mesh)
+        particles = None
+        try:
+            md = obj.modifiers.new("", md_type)
+            if md_type == 'PARTICLE_SYSTEM': particles = md.particle_system.settings
+            values = {}
+            for name, rna_prop in BlRna.properties(md):
+                value = getattr(md, name)
+                if name in array_names: value = tuple(value)
+                values[name] = value
+            return values
+        except (TypeError, RuntimeError):
+            return {} # can't be created on a mesh object: store all values
+        finally:
+            bpy.data.objects.remove(obj)
+            bpy.data.meshes.remove(mesh)
+            if particles and (particles.users == 0): bpy.data.particles.remove(particles)
+    
+    def __init__(self, md):
+        self.type = md.type
+        self.names = []
+        self.id_names = []
+        array_names = set()
+        
+        for name, rna_prop in BlRna.properties(md):
+            if rna_prop.is_readonly: continue
+            if BlRna.is_ID_pointer(rna_prop):
+                self.id_names.append(name)
+            elif rna_prop.type not in {'POINTER', 'COLLECTION'}:
+                self.names.append(name)
+                if getattr(rna_prop, "array_length", 0) != 0:
+                    array_names.add(name)
+        
+        # Schema: property names in a fixed order; values are stored
+        # as sparse (index, value) tuples, with the values of a new modifier omitted
+        self.schema = tuple(self.names + self.id_names)
+        baseline = self.baseline(md.type, array_names)
+        self.defaults = tuple(baseline.get(name, self._unknown) for name in self.schema)
+        
+        tab = "    "
+        lines = ["def copy(src, dst):"]
+        for name in self.names:
+            if keyword.iskeyword(name):
+                lines.append(tab + "setattr(dst, {0!r}, getattr(src, {0!r}))".format(name))
+            else:
+                lines.append(tab + "dst.{0} = src.{0}".format(name))
+        for name in self.id_names:
+            lines.append(tab + "set_safe(dst, {0!r}, getattr(src, {0!r}))".format(name))
+        lines.append(tab + "pass")
+        
+        lines.append("def pack(src):")
+        lines.append(tab + "values = []")
+        for i, name in enumerate(self.schema):
+            getter = "getattr(src, {0!r})".format(name)
+            if name in array_names: getter = "tuple({})".format(getter)
+            lines.append(tab + "value = {}".format(getter))
+            lines.append(tab + "if value != defaults[{0}]: values.append(({0}, value))".format(i))
+        lines.append(tab + "return tuple(values)")
+        
+        code = "\n".join(lines)
+        localvars = {"set_safe":self.set_safe, "defaults":self.defaults}
+        exec(code, localvars, localvars)
+        self._copy = localvars["copy"]
+        self.pack = localvars["pack"]
+    
+    def copy(self, src, dst):
+        try:
+            self._copy(src, dst)
+        except (TypeError, ValueError, AttributeError):
+            # Some value can't be assigned: copy attribute by attribute, skipping it
+            set_safe = self.set_safe
+            for name in self.schema:
+                set_safe(dst, name, getattr(src, name))
+    
+    def unpack(self, values, dst):
+        schema, set_safe = self.schema, self.set_safe
+        for i, value in values:
+            set_safe(dst, schema[i], value)
+
+class StackIndex:
+    """
+    Index of objects by modifier stack fingerprint (ordered types + hash of parameters).
+    Fingerprints are recalculated only for the objects updated since the last query.
+    """
+    fingerprints = {} # object pointer -> fingerprint
+    objects = {} # fingerprint -> set of object pointers
+    dirty = set()
+    blend_hash = None
+    
+    @staticmethod
+    def fingerprint(obj):
+        types = tuple(md.type for md in obj.modifiers)
+        params = tuple(hashable_value(modifier_params(md)) for md in obj.modifiers)
+        return (types, hash(params))
+    
+    @classmethod
+    def reset(cls):
+        cls.fingerprints.clear()
+        cls.objects.clear()
+        cls.dirty.clear()
+    
+    @classmethod
+    def tag_updated(cls):
+        blend_hash = bpy.data.as_pointer()
+        if cls.blend_hash != blend_hash: # undo or file load
+            cls.blend_hash = blend_hash
+            cls.reset()
+            return
+        if not cls.fingerprints: return
+        if not bpy.data.objects.is_updated: return
+        for obj in bpy.data.objects:
+            if obj.is_updated or obj.is_updated_data:
+                cls.dirty.add(obj.as_pointer())
+    
+    @classmethod
+    def get(cls, obj):
+        key = obj.as_pointer()
+        fingerprint = cls.fingerprints.get(key)
+        if (fingerprint is not None) and (key not in cls.dirty): return fingerprint
+        
+        cls.dirty.discard(key)
+        new_fingerprint = cls.fingerprint(obj)
+        if new_fingerprint != fingerprint:
+            if fingerprint is not None:
+                keys = cls.objects[fingerprint]
+                keys.discard(key)
+                if not keys: del cls.objects[fingerprint]
+            cls.fingerprints[key] = new_fingerprint
+            cls.objects.setdefault(new_fingerprint, set()).add(key)
+        return new_fingerprint
+    
+    @classmethod
+    def same_as(cls, obj, objects):
+        for _obj in objects: cls.get(_obj) # make sure the index is up to date
+        keys = cls.objects.get(cls.get(obj), ())
+        return [_obj for _obj in objects if _obj.as_pointer() in keys]
+    
+    @classmethod
+    def group(cls, objects):
+        groups = {}
+        for obj in objects:
+            if not obj.modifiers: continue
+            groups.setdefault(cls.get(obj), []).append(obj)
+        return groups
+
+@addon.scene_update_post
+def scene_update_post(scene):
+    StackIndex.tag_updated()
+
+def mesh_content_hash(mesh, vertex_groups=False):
+    """Hash of the mesh geometry and the per-element data that modifiers may depend on"""
+    digest = hashlib.md5()
+    
+    def add_attrs(collection, attrs, typecode, size=1):
+        for attr in attrs:
+            values = array(typecode, [0]) * (len(collection) * size)
+            collection.foreach_get(attr, values)
+            digest.update(values.tobytes())
+    
+    add_attrs(mesh.vertices, ["co"], 'f', 3)
+    add_attrs(mesh.vertices, ["bevel_weight"], 'f')
+    add_attrs(mesh.edges, ["vertices"], 'i', 2)
+    add_attrs(mesh.edges, ["crease", "bevel_weight"], 'f')
+    add_attrs(mesh.edges, ["use_seam", "use_edge_sharp"], 'b')
+    add_attrs(mesh.loops, ["vertex_index"], 'i')
+    add_attrs(mesh.polygons, ["loop_start", "loop_total", "material_index"], 'i')
+    add_attrs(mesh.polygons, ["use_smooth"], 'b')
+    for uv_layer in mesh.uv_layers:
+        add_attrs(uv_layer.data, ["uv"], 'f', 2)
+    for color_layer in mesh.vertex_colors:
+        add_attrs(color_layer.data, ["color"], 'f', 3)
+    
+    if vertex_groups:
+        weights = [(v.index, g.group, g.weight) for v in mesh.vertices for g in v.groups]
+        digest.update(repr(weights).encode())
+    
+    return (digest.digest(), mesh.use_auto_smooth, mesh.auto_smooth_angle,
+        tuple(mesh.materials), tuple(uv_layer.name for uv_layer in mesh.uv_layers),
+        tuple(color_layer.name for color_layer in mesh.vertex_colors))
+
 class BatchOperations:
     clipbuffer = None
     
@@ -141,9 +360,14 @@ class BatchOperations:
                 md = obj.modifiers.new(idname.capitalize(), idname)
     
     @classmethod
-    def apply(cls, objects, scene, idnames, options=(), apply_as='DATA'):
+    def apply(cls, objects, scene, idnames, options=(), apply_as='DATA', failures=None):
+        idnames = cls.split_idnames(idnames)
+        apply_modifiers(objects, scene, idnames, options, apply_as, failures)
+    
+    @classmethod
+    def iter_apply(cls, objects, scene, idnames, options=(), apply_as='DATA', failures=None):
         idnames = cls.split_idnames(idnames)
-        apply_modifiers(objects, scene, idnames, options, apply_as)
+        return iter_apply_modifiers(objects, scene, idnames, options, apply_as, failures)
     
     @classmethod
     def remove(cls, objects, idnames, from_file=False):
@@ -173,7 +397,8 @@ class BatchOperations:
         if not active_obj:
             cls.clipbuffer = []
         else:
-            cls.clipbuffer = [attrs_to_dict(md) for md in active_obj.modifiers if md.type not in exclude]
+            cls.clipbuffer = [(md.type, md.name, ModifierCopier.get(md).pack(md))
+                for md in active_obj.modifiers if md.type not in exclude]
     
     @classmethod
     def paste(cls, objects, paste_mode):
@@ -182,11 +407,11 @@ class BatchOperations:
         if paste_mode != 'AND':
             for obj in objects:
                 if paste_mode == 'SET': obj.modifiers.clear()
-                for md_info in md_infos:
-                    md = obj.modifiers.new(md_info["name"], md_info["type"])
-                    dict_to_attrs(md, md_info)
+                for md_type, md_name, values in md_infos:
+                    md = obj.modifiers.new(md_name, md_type)
+                    ModifierCopier.get(md).unpack(values, md)
         else:
-            idnames = {md_info["type"] for md_info in md_infos}
+            idnames = {md_type for md_type, md_name, values in md_infos}
             for obj in objects:
                 for md in tuple(obj.modifiers):
                     if md.type not in idnames:
@@ -219,7 +444,7 @@ class BatchOperations:
             
             def copy_params(md):
                 attr_source = attr_sources.get(md.type)
-                if attr_source: copyattrs(attr_source, md)
+                if attr_source: ModifierCopier.get(md).copy(attr_source, md)
         
         if assign_mode == 'ADD': # previously known as "Ensure"
             for obj in objects:
@@ -257,6 +482,8 @@ class BatchOperations:
 
 #============================================================================#
 
+apply_chunk_duration = 0.1 # seconds of work between UI updates
+
 @addon.Operator(idname="object.batch_{}_apply".format(category_name), options={'INTERNAL', 'REGISTER'}, description=
 "Click: Apply (+Ctrl: globally, +Alt: as shape)")
 def Operator_Apply(self, context, event, idnames="", index=0, title=""):
@@ -264,9 +491,114 @@ def Operator_Apply(self, context, event, idnames="", index=0, title=""):
     options = get_options()
     apply_as = 'DATA'
     if event and event.alt: apply_as = 'SHAPE'
+    globally = bool(event and event.ctrl)
     bpy.ops.ed.undo_push(message="Batch Apply {}".format(Category_Name_Plural))
-    BatchOperations.apply(options.iterate_objects(context, event.ctrl), context.scene, idnames, options.apply_options, apply_as=apply_as)
-    category.tag_refresh()
+    
+    objects = list(options.iterate_objects(context, globally))
+    failures = []
+    apply_iter = BatchOperations.iter_apply(objects, context.scene, idnames, options.apply_options, apply_as, failures)
+    
+    def finish(count, cancelled=False):
+        apply_iter.close() # cleanup happens on generator exit
+        if cancelled:
+            self.report({'WARNING'}, "Cancelled after {} of {} object(s)".format(count, len(objects)))
+        if failures:
+            self.report({'WARNING'}, format_apply_failures(failures))
+        category.tag_refresh()
+    
+    if not event:
+        for obj in apply_iter: pass
+        finish(len(objects))
+        yield {'FINISHED'}
+    
+    # Process objects in time-budgeted chunks, so that the UI stays responsive
+    # and the user can cancel (already processed objects stay applied)
+    wm = context.window_manager
+    wm.progress_begin(0.0, 1.0)
+    timer = wm.event_timer_add(0.01, context.window)
+    count = 0
+    
+    while True:
+        self, context, event = yield {'RUNNING_MODAL'}
+        
+        if event.type == 'ESC':
+            wm.event_timer_remove(timer)
+            wm.progress_end()
+            finish(count, True)
+            yield {'CANCELLED'}
+        
+        if event.type != 'TIMER': continue
+        
+        time_stop = time.clock() + apply_chunk_duration
+        for obj in apply_iter:
+            count += 1
+            if time.clock() > time_stop: break
+        else:
+            break # all objects are processed
+        
+        wm.progress_update(count / len(objects))
+    
+    wm.event_timer_remove(timer)
+    wm.progress_end()
+    finish(count)
+    yield {'FINISHED'}
+
+@addon.Operator(idname="object.batch_{}_select_same_stack".format(category_name), options={'INTERNAL', 'REGISTER'}, description=
+"Click: Select objects with the same modifier stack as the active one (+Shift: extend selection)", label="Select same stack")
+def Operator_Select_Same_Stack(self, context, event):
+    scene = context.scene
+    active_obj = scene.objects.active
+    if not (active_obj and active_obj.modifiers): return {'CANCELLED'}
+    bpy.ops.ed.undo_push(message="Select Same {} Stack".format(Category_Name))
+    same_objects = set(StackIndex.same_as(active_obj, scene.objects))
+    for obj in scene.objects:
+        if obj.hide_select or not obj.is_visible(scene): continue
+        if obj in same_objects:
+            obj.select = True
+        elif not event.shift:
+            obj.select = False
+    return {'FINISHED'}
+
+@addon.Operator(idname="object.batch_{}_group_by_stack".format(category_name), options={'INTERNAL', 'REGISTER'}, description=
+"Click: Put objects with identical modifier stacks into groups (+Ctrl: globally)", label="Group by stack")
+def Operator_Group_By_Stack(self, context, event):
+    options = get_options()
+    bpy.ops.ed.undo_push(message="Group Objects by {} Stack".format(Category_Name))
+    groups = StackIndex.group(options.iterate_objects(context, event.ctrl))
+    for fingerprint, objects in groups.items():
+        if len(objects) < 2: continue # unique stacks don't need a group
+        types, params_hash = fingerprint
+        group = bpy.data.groups.new("+".join(md_type.capitalize() for md_type in types))
+        for obj in objects:
+            group.objects.link(obj)
+    addon.external.groups.tag_refresh()
+    return {'FINISHED'}
+
+@addon.Operator(idname="object.batch_{}_deduplicate_stacks".format(category_name), options={'INTERNAL', 'REGISTER'}, description=
+"Click: Make objects with identical modifier stacks and identical meshes share one mesh (+Ctrl: globally)", label="Deduplicate stacks")
+def Operator_Deduplicate_Stacks(self, context, event):
+    options = get_options()
+    bpy.ops.ed.undo_push(message="Deduplicate {} Stacks".format(Category_Name))
+    old_meshes = set()
+    for objects in StackIndex.group(options.iterate_objects(context, event.ctrl)).values():
+        if len(objects) < 2: continue
+        shared_meshes = {}
+        for obj in objects:
+            mesh = obj.data
+            if (obj.type != 'MESH') or mesh.shape_keys or mesh.library: continue
+            key = (mesh_content_hash(mesh, bool(obj.vertex_groups)), tuple(vg.name for vg in obj.vertex_groups))
+            shared_mesh = shared_meshes.setdefault(key, mesh)
+            if shared_mesh != mesh:
+                obj.data = shared_mesh
+                old_meshes.add(mesh)
+    
+    count = 0
+    for mesh in old_meshes:
+        if mesh.users != 0: continue
+        bpy.data.meshes.remove(mesh)
+        count += 1
+    self.report({'INFO'}, "Removed {} duplicate mesh(es)".format(count))
+    get_category().tag_refresh()
     return {'FINISHED'}
 
 class OptionsMixin:
@@ -278,6 +610,7 @@ class OptionsMixin:
         ('DELETE_OPERANDS', "Delete operands", "Delete the remaining boolean operands", 'MOD_BOOLEAN'),
         ('APPLY_SHAPE_KEYS', "Apply shape keys", "Apply shape keys before applying the modifiers", 'SHAPEKEY_DATA'),
         ('VISIBLE_ONLY', "Only visible", "Apply only the modifiers visible in the viewport", 'RESTRICT_VIEW_OFF'),
+        ('KEEP_INSTANCES', "Keep instancing", "Apply identical stacks of shared meshes only once and keep the result shared", 'LINKED'),
     ])
 
 @addon.Menu(idname="VIEW3D_MT_batch_{}_options_apply_options".format(category_name_plural), label="Apply Modifier")
@@ -286,7 +619,12 @@ def Menu_ApplyModifierOptions(self, context):
     layout = NestedLayout(self.layout)
     options = get_options()
     layout.props_enum(options, "apply_options")
-menu_options_extra = [("menu", dict(menu="VIEW3D_MT_batch_{}_options_apply_options".format(category_name_plural), icon=category_icon))]
+menu_options_extra = [
+    ("menu", dict(menu="VIEW3D_MT_batch_{}_options_apply_options".format(category_name_plural), icon=category_icon)),
+    ("operator", dict(operator="object.batch_{}_select_same_stack".format(category_name), icon='RESTRICT_SELECT_OFF')),
+    ("operator", dict(operator="object.batch_{}_group_by_stack".format(category_name), icon='GROUP')),
+    ("operator", dict(operator="object.batch_{}_deduplicate_stacks".format(category_name), icon='AUTOMERGE_ON')),
+]
 
 aggregate_attrs = [
     #("show_expanded", dict(tooltip="Are modifier(s) expanded in the UI", icons=('TRIA_DOWN', 'TRIA_RIGHT'))),
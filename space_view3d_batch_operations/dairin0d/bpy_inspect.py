@@ -442,6 +442,16 @@ class BlRna:
         # first rna property item is always rna_type (?)
         return BlRna(obj).properties.items()[1:]
     
+    @staticmethod
+    def is_ID_pointer(rna_prop):
+        if rna_prop.type != 'POINTER': return False
+        # fixed_type is a blender struct, so isinstance() checks won't work
+        rna_struct = rna_prop.fixed_type
+        while rna_struct:
+            if rna_struct.identifier == "ID": return True
+            rna_struct = rna_struct.base
+        return False
+    
     @staticmethod
     def functions(obj):
         return BlRna(obj).functions[funcname].items()
@@ -34,6 +34,8 @@ import inspect
 import sys
 import traceback
 
+from collections import deque
+
 import bpy
 
 from mathutils import Vector, Matrix, Quaternion, Euler, Color
@@ -2151,6 +2153,140 @@ if not UIMonitor:
     
     bpy.utils.register_class(BACKGROUND_OT_ui_monitor) # REGISTER
 
+# ===== JOB SCHEDULER ===== #
+class JobTask:
+    __slots__ = ("generator", "priority", "deadline", "name", "owner", "submitted", "started", "sequence", "cancelled", "done")
+    
+    def __init__(self, generator, priority, deadline, name, owner, submitted, sequence):
+        self.generator = generator
+        self.priority = priority
+        self.deadline = deadline # absolute time (or None)
+        self.name = name or getattr(generator, "__name__", "job")
+        self.owner = owner
+        self.submitted = submitted
+        self.started = None
+        self.sequence = sequence
+        self.cancelled = False
+        self.done = False
+    
+    def cancel(self):
+        self.cancelled = True
+        try:
+            self.generator.close() # run the generator's cleanup now
+        except ValueError:
+            pass # the task cancels itself while running; it will be dropped
+    
+    def key(self, now):
+        # overdue tasks first, then by priority (higher first), then the earliest deadline, then FIFO
+        deadline = (self.deadline if self.deadline is not None else float("inf"))
+        return (deadline > now, -self.priority, deadline, self.sequence)
+
+class JobScheduler:
+    """
+    Cooperative scheduler of generator-based tasks. At most once per
+    min_interval, tasks are resumed in the order of priority/deadline until
+    the budget is used. The budget is what remains of the target frame time
+    after Blender's own work (the measured interval between runs minus the
+    time spent in jobs), so a slow frame leaves less time for background work.
+    A task can yield NEXT_FRAME to give up the rest of the current run.
+    """
+    NEXT_FRAME = object()
+    
+    clock = staticmethod(time.perf_counter) # wall time (time.clock is CPU time on Linux)
+    min_interval = 0.01
+    target_frame_time = 1.0 / 60.0
+    min_budget = 0.001
+    max_budget = 0.002 # at most ~17% of the time, as with the old fixed 2 ms per 10 ms
+    frame_time_smoothing = 0.1
+    max_frame_gap = 0.5 # longer gaps are idle time, not frame time
+    
+    def __init__(self):
+        self.tasks = []
+        self.sequence = 0
+        self.frame_time = 0.0
+        self.budget = self.min_budget
+        self.last_run = None
+        self.last_work = 0.0 # time spent in the previous run()
+        self.latencies = deque(maxlen=64) # delay between submission and the first resume
+        self.completed = 0
+    
+    def submit(self, generator, priority=0, deadline=None, name=None, owner=None):
+        """deadline is in seconds from now; overdue tasks are run before all others"""
+        now = self.clock()
+        if deadline is not None: deadline = now + deadline
+        self.sequence += 1
+        task = JobTask(generator, priority, deadline, name, owner, now, self.sequence)
+        self.tasks.append(task)
+        return task
+    
+    def cancel(self, task=None, owner=None):
+        for _task in self.tasks:
+            if (_task is task) or ((owner is not None) and (_task.owner is owner)):
+                _task.cancel()
+    
+    def measure_frame(self, now):
+        if self.last_run is not None:
+            frame_time = now - self.last_run - self.last_work
+            if frame_time < self.max_frame_gap:
+                k = self.frame_time_smoothing
+                self.frame_time = self.frame_time * (1.0 - k) + frame_time * k
+        self.last_run = now
+        budget = self.target_frame_time - self.frame_time
+        self.budget = min(max(budget, self.min_budget), self.max_budget)
+    
+    def run(self):
+        clock = self.clock
+        now = clock()
+        if (self.last_run is not None) and (now - self.last_run < self.min_interval): return
+        self.measure_frame(now)
+        time_stop = now + self.budget
+        
+        self.tasks = [task for task in self.tasks if not (task.cancelled or task.done)]
+        pending = sorted(self.tasks, key=(lambda task: task.key(now)))
+        
+        for task in pending:
+            if clock() > time_stop: break
+            if task.cancelled: continue
+            
+            if task.started is None:
+                task.started = clock()
+                self.latencies.append(task.started - task.submitted)
+            
+            try:
+                while not task.cancelled:
+                    if next(task.generator) is self.NEXT_FRAME: break
+                    if clock() > time_stop: break
+            except StopIteration:
+                task.done = True
+                self.completed += 1
+            except Exception as exc:
+                task.done = True
+                print("Error in background job {}:".format(task.name))
+                traceback.print_exc()
+            
+            if not task.done:
+                # let the tasks of the same priority take turns
+                self.sequence += 1
+                task.sequence = self.sequence
+        
+        self.last_work = clock() - now
+    
+    @property
+    def queue_depth(self):
+        return sum(1 for task in self.tasks if not (task.cancelled or task.done))
+    
+    @property
+    def metrics(self):
+        latencies = self.latencies
+        return dict(
+            queue_depth=self.queue_depth,
+            completed=self.completed,
+            frame_time=self.frame_time,
+            budget=self.budget,
+            latency=(sum(latencies) / len(latencies) if latencies else 0.0),
+            max_latency=max(latencies, default=0.0),
+        )
+
 # ===== ADDONS REGISTRY ===== #
 class AddonsRegistry:
     _scene_update_pre_key = "\x02{generic-addon-scene_update_pre-%s}\x03" % version
@@ -2212,10 +2348,6 @@ class AddonsRegistry:
     background_job = []
     selection_job = []
     
-    job_duration = 0.002
-    job_interval = job_duration * 5
-    job_next_update = 0.0
-    
     zbuf_users = 0
     module_infos = {}
     module_users = {}
@@ -2244,6 +2376,7 @@ class AddonsRegistry:
         if addon._scene_update_post: self.scene_update_post.remove(addon)
         if addon._background_job: self.background_job.remove(addon)
         if addon._selection_job: self.selection_job.remove(addon)
+        self.scheduler.cancel(owner=addon)
         
         for module_path in self.module_infos:
             if module_path.startswith(addon.path):
@@ -2261,6 +2394,38 @@ class AddonsRegistry:
                         traceback.print_exc()
         return event
     
+    # The legacy per-addon callbacks are run as long-lived scheduler tasks
+    # (an exception must not end these generators, or the tasks would be dropped for the whole session)
+    def iter_background_jobs(self):
+        while True:
+            try:
+                job_count = sum(len(addon._background_job) for addon in self.background_job)
+                jobs = [(addon, callback) for addon in self.background_job for callback in addon._background_job]
+            except Exception as exc:
+                print("Error in background jobs:")
+                traceback.print_exc()
+                jobs = []
+            
+            for addon, callback in jobs:
+                try:
+                    callback(self.scheduler.budget / job_count)
+                except Exception as exc:
+                    print("Error in {} background job {}:".format(addon.module_name, callback.__name__))
+                    traceback.print_exc()
+                yield
+            
+            yield JobScheduler.NEXT_FRAME
+    
+    def iter_selection_analysis(self):
+        while True:
+            try:
+                if self.selection_job:
+                    self.analyze_selection(self.scheduler.budget * 0.5)
+            except Exception as exc:
+                print("Error in selection analysis:")
+                traceback.print_exc()
+            yield JobScheduler.NEXT_FRAME
+    
     def __new__(cls, module_info):
         scene_update_pre = None
         for callback in bpy.app.handlers.scene_update_pre:
@@ -2283,6 +2448,10 @@ class AddonsRegistry:
             self._sel_iter = ResumableSelection()
             self.event_lock = PrimitiveLock()
             
+            self.scheduler = JobScheduler()
+            self.scheduler.submit(self.iter_selection_analysis(), priority=1, name="selection analysis")
+            self.scheduler.submit(self.iter_background_jobs(), priority=0, name="background jobs")
+            
             @bpy.app.handlers.persistent
             def load_pre(*args, **kwargs):
                 addons_registry.load_pre()
@@ -2357,26 +2526,7 @@ class AddonsRegistry:
                                 print("Error in {} scene_update_post {}:".format(addon.module_name, callback.__name__))
                                 traceback.print_exc()
                     
-                    curr_time = time.clock()
-                    if curr_time > self.job_next_update:
-                        job_count = sum(len(addon._background_job) for addon in self.background_job)
-                        loop_count = (int(job_count > 0) + int(bool(self.selection_job)))
-                        loop_duration = self.job_duration / max(loop_count, 1)
-                        
-                        if job_count > 0:
-                            job_duration = loop_duration / job_count
-                            
-                            for addon in self.background_job:
-                                for callback in addon._background_job:
-                                    try:
-                                        callback(job_duration)
-                                    except Exception as exc:
-                                        print("Error in {} background job {}:".format(addon.module_name, callback.__name__))
-                                        traceback.print_exc()
-                        
-                        if self.selection_job: self.analyze_selection(loop_duration)
-                        
-                        self.job_next_update = time.clock() + self.job_interval
+                    self.scheduler.run()
             
             scene_update_post.__name__ = cls._scene_update_post_key
             setattr(scene_update_post, cls._addons_registry_key, self)
@@ -20,11 +20,19 @@ import bpy
 import bmesh
 
 import time
+import itertools
+
+from collections import deque
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
 
 import mathutils
 from mathutils import Color, Vector, Euler, Quaternion, Matrix
 
-from .bpy_inspect import BlEnums
+from .bpy_inspect import BlEnums, BlRna
 
 from .utils_math import lerp, matrix_LRS, matrix_compose, matrix_decompose, matrix_inverted_safe, orthogonal_XYZ, orthogonal, transform_point_normal
 from .utils_python import setattr_cmp, setitem_cmp, AttributeHolder, attrs_to_dict, dict_to_attrs, bools_to_int, binary_search
@@ -1387,39 +1395,225 @@ class Selection:
         else:
             pass # no selectable elements in other modes
 
+class SelectionBits:
+    """
+    Packed bitset of a boolean attribute (e.g. "select") of all items in a
+    collection, in collection order (bit i corresponds to collection[i]).
+    Supports &, |, ^, - (difference); the list of items whose bit is set
+    is materialized only when requested.
+    """
+    __slots__ = ("collection", "attr", "count", "bits", "_items")
+    
+    _buffers = {} # item count -> reusable foreach_get buffer
+    
+    def __init__(self, collection, attr="select", bits=None, count=None, keep_items=False):
+        if bits is None:
+            count = len(collection)
+            bits = self.pack(self.read(collection, attr, count), count)
+        self.collection = collection
+        self.attr = attr
+        self.count = count
+        self.bits = bits
+        self._items = None
+        # restore() can fall back to the item references if the collection changes
+        if keep_items: self._items = self.items
+    
+    @classmethod
+    def buffer(cls, count):
+        values = cls._buffers.get(count)
+        if values is None:
+            if len(cls._buffers) >= 8: cls._buffers.clear()
+            values = (numpy.empty(count, dtype=bool) if numpy else [False]*count)
+            cls._buffers[count] = values
+        return values
+    
+    @classmethod
+    def read(cls, collection, attr, count):
+        values = cls.buffer(count)
+        collection.foreach_get(attr, values)
+        return values
+    
+    @staticmethod
+    def pack(values, count):
+        if not numpy: return bools_to_int(values)
+        # numpy.packbits() puts the first item into the highest bit, so pack in reverse
+        padding = (-count) % 8
+        return int.from_bytes(numpy.packbits(values[::-1]).tobytes(), "big") >> padding
+    
+    def unpack(self):
+        count, bits = self.count, self.bits
+        if not numpy: return [bool((bits >> i) & 1) for i in range(count)]
+        padding = (-count) % 8
+        data = (bits << padding).to_bytes((count + padding) // 8, "big")
+        return numpy.unpackbits(numpy.frombuffer(data, dtype=numpy.uint8))[count-1::-1].astype(bool)
+    
+    # Attention: it is assumed that there was no Undo and no items were reordered
+    def restore(self, bulk=False):
+        """
+        bulk: write with one foreach_set (skips RNA updates, so only for
+        mesh elements and the like); otherwise only the differing items are
+        assigned through setattr (e.g. Object.select must sync its Bases)
+        """
+        attr = self.attr
+        if len(self.collection) != self.count: # items were added/removed
+            return (False if bulk else self.restore_by_items())
+        if bulk:
+            self.collection.foreach_set(attr, self.unpack())
+        else:
+            for item in (self ^ SelectionBits(self.collection, attr)):
+                setattr(item, attr, not getattr(item, attr))
+        return True
+    
+    def restore_by_items(self):
+        if self._items is None: return False # the items were not kept
+        pointers = set()
+        for item in self._items:
+            try:
+                pointers.add(item.as_pointer())
+            except ReferenceError:
+                pass # the item was removed
+        attr = self.attr
+        for item in self.collection:
+            state = (item.as_pointer() in pointers)
+            if getattr(item, attr) != state: setattr(item, attr, state)
+        return True
+    
+    @property
+    def items(self):
+        if self._items is None:
+            self._items = (list(itertools.compress(self.collection, self.unpack())) if self.bits else [])
+        return self._items
+    
+    def __iter__(self):
+        return iter(self.items)
+    
+    def __len__(self):
+        return bin(self.bits).count("1")
+    
+    def __bool__(self):
+        return self.bits != 0
+    
+    def __eq__(self, other):
+        return (self.count == other.count) and (self.bits == other.bits)
+    
+    def __ne__(self, other):
+        return not self.__eq__(other)
+    
+    def __hash__(self):
+        return hash((self.count, self.bits))
+    
+    def __combine(self, other, bits):
+        if (self.count != other.count) or (self.collection != other.collection):
+            raise ValueError("bitsets must describe the same collection")
+        return SelectionBits(self.collection, self.attr, bits, self.count)
+    
+    def __and__(self, other):
+        return self.__combine(other, self.bits & other.bits)
+    
+    def __or__(self, other):
+        return self.__combine(other, self.bits | other.bits)
+    
+    def __xor__(self, other):
+        return self.__combine(other, self.bits ^ other.bits)
+    
+    def __sub__(self, other):
+        return self.__combine(other, self.bits & ~other.bits)
+    
+    def __invert__(self):
+        return SelectionBits(self.collection, self.attr, self.bits ^ ((1 << self.count) - 1), self.count)
+
+class SelectionColumns:
+    """
+    Selection/visibility flags of whole collections, read with one foreach_get
+    per attribute and stored as SelectionBits. Object flags are written back
+    through setattr, only for the objects whose state differs; mesh elements
+    are written with one foreach_set. Mesh elements are captured only when
+    the active mesh is in Object mode (in Edit mode, mesh data is not in sync).
+    """
+    def __init__(self, context=None, object_attrs=("select", "hide"), element_attrs=("select", "hide")):
+        context = context or bpy.context
+        scene = context.scene
+        active_obj = scene.objects.active
+        
+        self.scene = scene
+        self.active = active_obj
+        self.polygons_active = None
+        self.columns = [SelectionBits(scene.objects, attr, keep_items=True) for attr in object_attrs]
+        self.element_columns = []
+        
+        if element_attrs and active_obj and (active_obj.type == 'MESH') and (active_obj.mode == 'OBJECT'):
+            mesh = active_obj.data
+            for collection in (mesh.vertices, mesh.edges, mesh.polygons):
+                self.element_columns.extend(SelectionBits(collection, attr) for attr in element_attrs)
+            self.polygons_active = (mesh.polygons, mesh.polygons.active)
+    
+    @staticmethod
+    def fill(collection, attr, value):
+        bits = SelectionBits(collection, attr)
+        if value: bits = ~bits
+        for item in bits:
+            setattr(item, attr, value)
+    
+    # Attention: it is assumed that there was no Undo and no objects/elements were reordered
+    def restore(self):
+        for column in self.columns:
+            column.restore()
+        for column in self.element_columns:
+            column.restore(bulk=True)
+        if self.polygons_active:
+            polygons, index = self.polygons_active
+            if index < len(polygons): polygons.active = index
+        try:
+            self.scene.objects.active = self.active
+        except ReferenceError:
+            pass # the active object was removed
+
 class SelectionSnapshot:
     # The goal of SelectionSnapshot is to leave as little side-effects as possible,
     # so brute_force_update=True (since select_all operators are recorded in the info log)
     def __init__(self, context=None, brute_force_update=True):
         sel = Selection(context, brute_force_update=brute_force_update)
-        self.snapshot_curr = (sel, sel.active, sel.history, sel.selected)
-        
         self.mode = sel.normalized_mode
+        
+        # Object selection is captured in bulk; elements of other modes are recorded one by one
+        self.columns = SelectionColumns(context)
+        
         if self.mode == 'OBJECT':
-            self.snapshot_obj = self.snapshot_curr
+            self.selection_obj = sel
+            self.snapshot_curr = None
         else:
-            sel = Selection(context, 'OBJECT', brute_force_update=brute_force_update)
-            self.snapshot_obj = (sel, sel.active, sel.history, sel.selected)
+            self.selection_obj = Selection(context, 'OBJECT', brute_force_update=brute_force_update)
+            self.snapshot_curr = (sel, sel.active, sel.history, sel.selected)
+        self.selection_curr = sel
+    
+    @property
+    def active_object(self):
+        return self.columns.active
+    
+    @property
+    def selected_objects(self):
+        return self.columns.columns[0] # SelectionBits of scene.objects
     
     # Attention: it is assumed that there was no Undo,
     # objects' modes didn't change, and all elements are still valid
     def restore(self):
-        if self.mode != 'OBJECT':
-            sel, active, history, selected = self.snapshot_obj
+        self.columns.restore()
+        
+        if self.snapshot_curr:
+            sel, active, history, selected = self.snapshot_curr
             sel.selected = selected
             sel.history = history
             sel.active = active
-        
-        sel, active, history, selected = self.snapshot_curr
-        sel.selected = selected
-        sel.history = history
-        sel.active = active
+    
+    def deselect_objects(self):
+        SelectionColumns.fill(self.columns.scene.objects, "select", False)
     
     def __str__(self):
-        if self.mode != 'OBJECT':
-            return str({'OBJECT':self.snapshot_obj[1:], self.mode:self.snapshot_curr[1:]})
+        snapshot_obj = (self.active_object, self.selected_objects.items)
+        if self.snapshot_curr:
+            return str({'OBJECT':snapshot_obj, self.mode:self.snapshot_curr[1:]})
         else:
-            return str({'OBJECT':self.snapshot_obj[1:]})
+            return str({'OBJECT':snapshot_obj})
     
     def __enter__(self):
         pass
@@ -1431,9 +1625,7 @@ def IndividuallyActiveSelected(objects, context=None, make_visble=False):
     if context is None: context = bpy.context
     
     prev_selection = SelectionSnapshot(context)
-    sel, active, history, selected = prev_selection.snapshot_obj
-    
-    sel.selected = {}
+    prev_selection.deselect_objects()
     
     scene = context.scene
     scene_objects = scene.objects
@@ -1463,6 +1655,51 @@ def IndividuallyActiveSelected(objects, context=None, make_visble=False):
     
     prev_selection.restore()
 
+def IndividualContextOverrides(objects, context=None):
+    """
+    Yields (object, context override) pairs, the override making the object
+    active and the only selected one. Unlike IndividuallyActiveSelected,
+    nothing in the scene is changed, so this only works for operators which
+    take their objects from the context members. The dict is reused.
+    """
+    if context is None: context = bpy.context
+    
+    override = context.copy()
+    override["edit_object"] = None
+    
+    for obj in objects:
+        try:
+            selected = [obj]
+            editable = (obj.library is None)
+        except ReferenceError:
+            continue # for some reason object doesn't exist anymore
+        
+        override["object"] = obj
+        override["active_object"] = obj
+        override["selected_objects"] = selected
+        override["selected_editable_objects"] = (selected if editable else [])
+        
+        yield obj, override
+
+def ObjectsContextOverride(objects, context=None):
+    """Context override that makes the given objects the selected ones (nothing in the scene is changed)"""
+    if context is None: context = bpy.context
+    
+    selected = []
+    editable = []
+    for obj in objects:
+        try:
+            if obj.library is None: editable.append(obj)
+        except ReferenceError:
+            continue # for some reason object doesn't exist anymore
+        selected.append(obj)
+    
+    override = context.copy()
+    override["edit_object"] = None
+    override["selected_objects"] = selected
+    override["selected_editable_objects"] = editable
+    return override
+
 class ResumableSelection:
     def __init__(self, *args, **kwargs):
         kwargs["copy_bmesh"] = True # seems like this is REQUIRED to avoid crashes
@@ -1576,6 +1813,8 @@ class ChangeMonitor:
     reports_cleanup_trigger = 512
     reports_cleanup_count = 128
     max_evaluation_time = 0.002
+    min_rewalk_interval = 0.25 # delay before re-checking an unchanged selection
+    max_rewalk_interval = 2.0
     
     def __init__(self, context=None, update=True, **kwargs):
         if not context: context = bpy.context
@@ -1586,9 +1825,12 @@ class ChangeMonitor:
         self.mode = None
         self.active_obj = None
         self.selection_walker = None
-        self.selection_recorded = False
-        self.selection_recorder = []
-        self.selection_record_id = 0
+        self.selection_summary = None
+        self.selection_digest = None
+        self.selection_rolling = 0
+        self.selection_bits = None # object selection (read for the summary)
+        self.rewalk_time = 0.0
+        self.rewalk_interval = self.min_rewalk_interval
         self.scene_hash = 0
         self.undo_hash = 0
         self.operators_len = 0
@@ -1714,7 +1956,7 @@ class ChangeMonitor:
             # ATTENTION: inside mesh editmode, undo/redo DOES NOT affect
             # the rest of the blender objects, so pointers/hashes don't change.
             if (mode == 'EDIT_MESH') and (self.selection.bmesh is not None):
-                object_updated |= (not self.selection.bmesh.is_valid)
+                self.object_updated |= (not self.selection.bmesh.is_valid)
         
         operators_len = len(wm.operators)
         if (operators_len != self.operators_len):
@@ -1733,9 +1975,27 @@ class ChangeMonitor:
     def reset_selection(self):
         self.selection.bmesh = None
         self.selection_walker = None
-        self.selection_recorded = False
-        self.selection_recorder = []
-        self.selection_record_id = 0
+        self.selection_summary = None
+        self.selection_digest = None
+        self.selection_rolling = 0
+        self.rewalk_time = 0.0
+        self.rewalk_interval = self.min_rewalk_interval
+    
+    def summarize_selection(self, context, active_obj, actual_mode, mode):
+        # Cheap to obtain; if the summary differs, the selection has definitely changed
+        if mode == 'OBJECT':
+            # Object selection is read in bulk, so it is also used as the digest
+            self.selection_bits = SelectionBits(context.scene.objects)
+            return (mode, len(self.selection_bits), self.hash(active_obj))
+        elif (mode == 'EDIT_MESH') and (actual_mode == 'EDIT_MESH'):
+            mesh = active_obj.data
+            sel = self.selection
+            if not (sel.bmesh and sel.bmesh.is_valid):
+                sel.bmesh = bmesh.from_edit_mesh(mesh)
+            bm = sel.bmesh
+            return (mode, mesh.total_vert_sel, mesh.total_edge_sel, mesh.total_face_sel,
+                self.hash(bm.faces.active), len(bm.select_history))
+        return (mode,) + self.selection.stateless_info
     
     def analyze_selection(self):
         reset_selection = self.mode_changed
@@ -1753,68 +2013,116 @@ class ChangeMonitor:
             # about a potential change of selection.
             self.selection_changed = True
         
-        if self.selection_walker is None:
-            self.selection.bmesh = None
-            self.selection_walker = self.selection.walk()
+        context, active_obj, actual_mode, mode = self.selection.get_context()
+        if not mode: return
         
-        clock = time.clock()
+        summary = self.summarize_selection(context, active_obj, actual_mode, mode)
+        if summary != self.selection_summary:
+            if self.selection_summary is not None:
+                #print("Total/active changed")
+                self.selection_changed = True
+            self.reset_selection()
+            self.selection_summary = summary
+        
+        if mode == 'OBJECT':
+            # Object selection is read in bulk, so there's no need to spread it over several updates
+            digest = self.selection_bits
+            if (self.selection_digest is not None) and (digest != self.selection_digest):
+                self.selection_changed = True
+            self.selection_digest = digest
+            return
+        
+        # Other modes have no bulk access: fold the selected elements into a
+        # rolling digest, a few at a time, and compare it when a pass is complete
+        clock = time.perf_counter
+        now = clock()
+        time_stop = now + self.max_evaluation_time
         hash = self.hash
         
-        if self.selection_recorded:
-            time_stop = clock() + self.max_evaluation_time
-            
-            if self.selection_record_id == 0:
-                item = next(self.selection_walker, None)
-                history, active, total = item
-                item = tuple(hash(h) for h in history), hash(active), total
-                self.selection_record_id = 1
-                if self.selection_recorder[0] != item:
-                    #print("Active/history/total changed")
-                    self.selection_changed = True
-                    self.reset_selection()
-                    return
-            
-            recorded_count = len(self.selection_recorder)
-            for item in self.selection_walker:
-                if item[1]:
-                    item = hash(item[0]), item[1]
-                    i = self.selection_record_id
-                    if (i >= recorded_count) or (self.selection_recorder[i] != item):
-                        #print("More than necessary or selection changed")
-                        self.selection_changed = True
-                        self.reset_selection()
-                        return
-                    self.selection_record_id = i + 1
-                if clock() > time_stop: break
-            else: # the iterator is exhausted
-                if self.selection_record_id < recorded_count:
-                    #print("Less than necessary")
-                    self.selection_changed = True
-                    self.reset_selection()
-                    return
-                self.selection.bmesh = None
-                self.selection_walker = None
-                self.selection_record_id = 0
-        else:
-            time_stop = clock() + self.max_evaluation_time
-            
-            if self.selection_record_id == 0:
-                item = next(self.selection_walker, None)
-                history, active, total = item
-                item = tuple(hash(h) for h in history), hash(active), total
-                self.selection_record_id = 1
-                self.selection_recorder.append(item) # first item is special
-            
-            for item in self.selection_walker:
-                if item[1]:
-                    item = hash(item[0]), item[1]
-                    self.selection_recorder.append(item)
-                if clock() > time_stop: break
-            else: # the iterator is exhausted
-                self.selection.bmesh = None
+        if self.selection_walker is None:
+            # The summary is unchanged: the last complete pass is recent enough
+            if now < self.rewalk_time: return
+            self.selection_walker = self.selection.walk()
+            item = next(self.selection_walker, None)
+            if item is None:
                 self.selection_walker = None
-                self.selection_recorded = True
-                self.selection_record_id = 0
+                return
+            history, active, total = item
+            self.selection_rolling = hash((tuple(hash(h) for h in history), hash(active), total))
+        
+        rolling = self.selection_rolling
+        for item in self.selection_walker:
+            if item[1]: rolling = hash((rolling, hash(item[0]), item[1]))
+            if clock() > time_stop: break
+        else: # the iterator is exhausted
+            self.selection_walker = None
+            if (self.selection_digest is not None) and (rolling != self.selection_digest):
+                #print("Selection changed")
+                self.selection_changed = True
+                self.rewalk_interval = self.min_rewalk_interval
+            else:
+                # Nothing changed: re-check less and less often (the summary catches most changes)
+                self.rewalk_interval = min(self.rewalk_interval * 2, self.max_rewalk_interval)
+            self.rewalk_time = clock() + self.rewalk_interval
+            self.selection_digest = rolling
+        self.selection_rolling = rolling
+
+class OperatorHistory:
+    """
+    Bounded history of executed operators, collected from
+    window_manager.operators (so only operators with the REGISTER
+    option are seen). Entries are (idname, properties) tuples,
+    e.g. ("transform.translate", {"value":(1.0, 0.0, 0.0)}).
+    Meant to be updated from a frequently called handler.
+    """
+    def __init__(self, maxlen=128):
+        self.entries = deque(maxlen=maxlen)
+        self.keys = set() # pointers of the recorded operators
+        self.last_key = None
+    
+    @staticmethod
+    def make_entry(op):
+        category, name = op.bl_idname.split("_OT_", 1)
+        idname = "{}.{}".format(category.lower(), name)
+        # Same as in Info reports: only the properties that were explicitly set
+        return (idname, BlRna.serialize(op.properties, ignore_default=True))
+    
+    def update(self, context=None, refresh_last=False):
+        if not context: context = bpy.context
+        operators = context.window_manager.operators
+        
+        keys = set()
+        last_key = None
+        for op in operators:
+            last_key = op.as_pointer()
+            keys.add(last_key)
+            if last_key not in self.keys:
+                self.entries.append(self.make_entry(op))
+        
+        # The last operator can still be tweaked in the redo panel
+        if refresh_last and self.entries and (last_key == self.last_key) and (last_key is not None):
+            self.entries[-1] = self.make_entry(operators[-1])
+        
+        self.keys = keys
+        self.last_key = last_key
+    
+    def latest(self, count=None):
+        """Returns up to count most recent entries, most recent first"""
+        return list(itertools.islice(reversed(self.entries), count))
+    
+    def clear(self):
+        self.entries.clear()
+    
+    @staticmethod
+    def resolve(idname):
+        category, name = idname.split(".")
+        return getattr(getattr(bpy.ops, category), name)
+    
+    @staticmethod
+    def format(entry):
+        idname, properties = entry
+        args = ", ".join("{}={!r}".format(key, properties[key]) for key in sorted(properties))
+        return "bpy.ops.{}({})".format(idname, args)
 
 # ============================= BLENDER UTILS ============================== #
 #============================================================================#
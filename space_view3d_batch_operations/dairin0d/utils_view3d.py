@@ -780,8 +780,8 @@ class SmartView3D:
             obj_too = False
         
         if obj_too: # obj_too means we want to get either object or element, whichever is closer
-            sel = prev_selection.snapshot_curr[0] # current mode
-            sel_obj = prev_selection.snapshot_obj[0] # object mode
+            sel = prev_selection.selection_curr # current mode
+            sel_obj = prev_selection.selection_obj # object mode
         else:
             sel = Selection() # current mode
         mode = sel.normalized_mode